@@ -2,23 +2,156 @@
 Gemini AI Client - Integration with Google's Gemini AI for intelligent analysis
 """
 
-import google.generativeai as genai
+import asyncio
 import logging
-from typing import Dict, List, Optional
-import json
+import re
+from typing import Dict, List, Optional, Tuple
+import orjson
+import time
+from datetime import timedelta
+from cachetools import TTLCache
 
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Stable instructions shared by every analysis call; sent once as a cached
+# system instruction so only the market block is billed per request
+ANALYSIS_SYSTEM_PROMPT = """You are an expert binary options trading analyst. Analyze the market data in each message and provide insights.
+
+**Your Task:**
+1. Analyze if this looks like broker manipulation (sudden reversals, suspicious patterns)
+2. Predict the next likely move (UP or DOWN)
+3. Provide confidence level (0.0 to 1.0)
+4. Give brief reasoning
+
+**Respond in JSON format, keeping this field order:**
+{
+    "prediction": "UP" or "DOWN",
+    "confidence": 0.0-1.0,
+    "manipulation_detected": true/false,
+    "risk_level": "LOW", "MEDIUM", or "HIGH",
+    "reasoning": "brief explanation",
+    "manipulation_reason": "explanation if detected"
+}
+
+Be concise and data-driven. Focus on technical analysis."""
+
+# Per-call market block, filled in by _create_analysis_prompt
+MARKET_CONTEXT_TEMPLATE = """**Current Market Context:**
+- Detected Patterns: {patterns}
+- Recent Body Deltas (close-open): {candles}
+- Overall Trend: {trend}
+- Volatility: {volatility}
+- Near Support: {near_support}
+- Near Resistance: {near_resistance}
+"""
+
+_YES_NO = ('NO', 'YES')
+
+TREND_UP = "UPTREND"
+TREND_DOWN = "DOWNTREND"
+TREND_SIDEWAYS = "SIDEWAYS"
+
+# Threshold on the sum of the three slopes (0.0001 average)
+_TREND_SLOPE_SUM_THRESHOLD = 0.0003
+
+# Fields the prediction engine acts on; once all have streamed in, the
+# rest of the response (free-text reasoning) is not waited for
+DECISION_FIELDS = ('prediction', 'confidence', 'manipulation_detected', 'risk_level')
+
+# Free-text fields, which a streamed analysis resolves without; every path
+# fills the missing ones in so callers and the cache see one shape
+TEXT_FIELD_DEFAULTS = {'reasoning': '', 'manipulation_reason': ''}
+
+# A complete top-level "key": scalar pair, terminated by ',' or '}'
+_JSON_SCALAR_FIELD = re.compile(
+    r'"(\w+)"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null)\s*[,}]'
+)
+
+
+class _StreamingFieldParser:
+    """Incrementally pick scalar fields out of a JSON object as it streams in"""
+    
+    def __init__(self):
+        self.text = ''
+        self.fields = {}
+        self._pos = 0
+    
+    def feed(self, chunk: str):
+        self.text += chunk
+        
+        for match in _JSON_SCALAR_FIELD.finditer(self.text, self._pos):
+            self.fields[match.group(1)] = orjson.loads(match.group(2))
+            self._pos = match.end()
+    
+    def has_fields(self, keys) -> bool:
+        return all(key in self.fields for key in keys)
+
+
+class _BatchQueue:
+    """Pending analysis prompts, each paired with the future awaiting its result"""
+    
+    def __init__(self):
+        self._queue = asyncio.Queue()
+    
+    def submit(self, prompt: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((prompt, future))
+        return future
+    
+    async def collect(self, max_size: int, window: float) -> List[Tuple[str, asyncio.Future]]:
+        """
+        Wait for one prompt, then gather more until max_size or the window closes
+        
+        A prompt with nothing queued behind it is returned at once; the window
+        only opens when requests are already contending.
+        """
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        if self._queue.empty():
+            return batch
+        
+        deadline = loop.time() + window
+        
+        while len(batch) < max_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    def fail_pending(self, error: Exception):
+        """Fail the futures of prompts no batch has picked up yet"""
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(error)
+
 
 class GeminiClient:
     """Client for Gemini AI integration"""
     
     def __init__(self):
         self.model = None
+        self.analysis_model = None
+        self.context_cache = None
+        self._context_cache_expires = 0.0
         self.ready = False
         self.request_count = 0
+        self.cache_hits = 0
+        self._cache = TTLCache(
+            maxsize=settings.GEMINI_CACHE_SIZE,
+            ttl=settings.GEMINI_CACHE_TTL_SECONDS
+        )
+        self._cache_lock = asyncio.Lock()
+        self._batch_queue = _BatchQueue()
+        self._batch_worker = None
+        self._batch_calls = set()
         
     def initialize(self):
         """Initialize Gemini AI client"""
@@ -27,8 +160,12 @@ class GeminiClient:
             return False
         
         try:
+            # Imported here so processes without an API key never load the SDK
+            import google.generativeai as genai
+            
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+            self.analysis_model = self._create_analysis_model()
             self.ready = True
             logger.info(f"Gemini AI initialized with model: {settings.GEMINI_MODEL}")
             return True
@@ -36,6 +173,68 @@ class GeminiClient:
             logger.error(f"Failed to initialize Gemini: {e}")
             return False
     
+    def _create_analysis_model(self):
+        """
+        Build the model used by analyze_pattern
+        
+        The instruction prefix is uploaded once as cached content. Models or
+        prompts the caching API rejects (e.g. below its minimum token count)
+        fall back to a plain system instruction.
+        """
+        import google.generativeai as genai
+        from google.generativeai import caching
+        
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS
+        
+        try:
+            self.context_cache = caching.CachedContent.create(
+                model=settings.GEMINI_MODEL,
+                system_instruction=ANALYSIS_SYSTEM_PROMPT,
+                ttl=timedelta(seconds=ttl)
+            )
+            self._context_cache_expires = time.monotonic() + ttl
+            logger.info(f"Gemini context cache created: {self.context_cache.name}")
+            return genai.GenerativeModel.from_cached_content(cached_content=self.context_cache)
+        except Exception as e:
+            logger.info(f"Gemini context caching unavailable, using system instruction: {e}")
+            self.context_cache = None
+            return genai.GenerativeModel(
+                settings.GEMINI_MODEL,
+                system_instruction=ANALYSIS_SYSTEM_PROMPT
+            )
+    
+    async def _refresh_context_cache(self):
+        """Extend the cached prefix before the server expires it"""
+        if self.context_cache is None:
+            return
+        
+        if time.monotonic() < self._context_cache_expires - 60:
+            return
+        
+        ttl = settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS
+        try:
+            await asyncio.to_thread(self.context_cache.update, ttl=timedelta(seconds=ttl))
+            self._context_cache_expires = time.monotonic() + ttl
+        except Exception as e:
+            logger.warning(f"Gemini context cache refresh failed, rebuilding: {e}")
+            self.analysis_model = await asyncio.to_thread(self._create_analysis_model)
+    
+    async def warmup(self):
+        """
+        Open the shared Gemini connection ahead of the first analysis
+        
+        Every request rides the same long-lived async channel, so paying the
+        TLS handshake here keeps it off the first prediction's latency.
+        """
+        if not self.ready:
+            return
+        
+        try:
+            await self.model.count_tokens_async("ping")
+            logger.info("Gemini connection warmed up")
+        except Exception as e:
+            logger.warning(f"Gemini warmup failed: {e}")
+    
     async def analyze_pattern(
         self,
         features: Dict,
@@ -62,23 +261,141 @@ class GeminiClient:
             # Prepare context for AI
             context = self._prepare_context(features, patterns, candles, recent_performance)
             
+            # Consecutive candles usually bucket into the same context
+            cache_key = self._cache_key(context, candles)
+            async with self._cache_lock:
+                cached = self._cache.get(cache_key)
+            
+            if cached is not None:
+                self.cache_hits += 1
+                return dict(cached)
+            
             # Create prompt
             prompt = self._create_analysis_prompt(context)
             
-            # Get AI response
-            response = self.model.generate_content(prompt)
+            # Queue for the batch worker, which may merge concurrent requests
+            analysis = await self._submit_analysis(prompt)
             
-            # Parse response
-            analysis = self._parse_response(response.text)
-            
-            self.request_count += 1
+            if analysis:
+                async with self._cache_lock:
+                    self._cache[cache_key] = analysis
             
-            return analysis
+            return dict(analysis) if analysis else analysis
             
         except Exception as e:
             logger.error(f"Gemini analysis failed: {e}")
             return None
     
+    async def _submit_analysis(self, prompt: str) -> Optional[Dict]:
+        """Hand a prompt to the batch worker and wait for its parsed analysis"""
+        if self._batch_worker is None or self._batch_worker.done():
+            self._batch_worker = asyncio.create_task(self._run_batch_worker())
+        
+        return await self._batch_queue.submit(prompt)
+    
+    async def _run_batch_worker(self):
+        """Drain queued prompts into batches and dispatch one Gemini call per batch"""
+        window = settings.GEMINI_BATCH_WINDOW_MS / 1000
+        
+        while True:
+            batch = await self._batch_queue.collect(settings.GEMINI_BATCH_MAX_SIZE, window)
+            
+            # Dispatch without waiting so the next window starts immediately
+            task = asyncio.create_task(self._analyze_batch(batch))
+            self._batch_calls.add(task)
+            task.add_done_callback(self._batch_calls.discard)
+    
+    async def _analyze_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Run one Gemini call for a batch and resolve every waiting future"""
+        futures = [future for _, future in batch]
+        
+        try:
+            await self._refresh_context_cache()
+            
+            if len(batch) == 1:
+                results = [await self._stream_analysis(batch[0][0])]
+            else:
+                prompt = self._create_batch_prompt([prompt for prompt, _ in batch])
+                response = await self.analysis_model.generate_content_async(prompt)
+                results = self._parse_batch_response(response.text, len(batch))
+            
+            results = [self._complete_analysis(result) for result in results]
+            self.request_count += 1
+            
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+        
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        
+        finally:
+            # Cancelled at shutdown: fail callers rather than leave them waiting
+            for future in futures:
+                if not future.done():
+                    future.set_exception(RuntimeError("Gemini client shut down"))
+    
+    async def _stream_analysis(self, prompt: str) -> Optional[Dict]:
+        """
+        Stream a single analysis and return as soon as the decision fields are in
+        
+        The trailing reasoning text is not waited for, so an early result
+        carries empty 'reasoning' and 'manipulation_reason' (filled in by
+        _complete_analysis); when the stream ends first, the full response
+        is parsed as usual.
+        """
+        response = await self.analysis_model.generate_content_async(prompt, stream=True)
+        parser = _StreamingFieldParser()
+        chunks = aiter(response)
+        
+        try:
+            async for chunk in chunks:
+                try:
+                    parser.feed(chunk.text)
+                except ValueError:
+                    # Chunk without text parts (e.g. finish metadata)
+                    continue
+                
+                if parser.has_fields(DECISION_FIELDS):
+                    return parser.fields
+        finally:
+            # Cancel the rest of the generation instead of leaving the stream
+            # open until garbage collection
+            await self._close_stream(response, chunks)
+        
+        return self._parse_response(parser.text)
+    
+    @staticmethod
+    def _complete_analysis(analysis: Optional[Dict]) -> Optional[Dict]:
+        """Add defaults for any free-text fields the analysis lacks"""
+        if analysis is None:
+            return None
+        
+        completed = dict(analysis)
+        for key, default in TEXT_FIELD_DEFAULTS.items():
+            completed.setdefault(key, default)
+        return completed
+    
+    @staticmethod
+    async def _close_stream(response, chunks):
+        """Close a streamed response and the SDK stream underneath it"""
+        await chunks.aclose()
+        
+        # The SDK keeps its transport iterator private and has no close()
+        stream = getattr(response, '_iterator', None)
+        if stream is None:
+            return
+        
+        try:
+            if hasattr(stream, 'aclose'):
+                await stream.aclose()
+            if hasattr(stream, 'cancel'):
+                stream.cancel()
+        except Exception as e:
+            logger.debug(f"Gemini stream close skipped: {e}")
+    
     def _prepare_context(
         self,
         features: Dict,
@@ -90,20 +407,16 @@ class GeminiClient:
         # Get last 5 candles
         recent_candles = candles[-5:] if len(candles) >= 5 else candles
         
-        # Simplify candle data
-        candle_summary = []
-        for c in recent_candles:
-            direction = "🟢 UP" if c['close'] > c['open'] else "🔴 DOWN"
-            body_size = abs(c['close'] - c['open'])
-            candle_summary.append(f"{direction} (body: {body_size:.5f})")
+        # Signed body per candle: the sign carries direction, so no labels needed
+        candle_summary = [round(c['close'] - c['open'], 5) for c in recent_candles]
         
         context = {
             'patterns_detected': patterns if patterns else ['none'],
             'recent_candles': candle_summary,
             'trend': self._determine_trend(features),
             'volatility': features.get('volatility_ratio', 1.0),
-            'near_support': features.get('near_support', 0) == 1,
-            'near_resistance': features.get('near_resistance', 0) == 1,
+            'near_support': bool(features.get('near_support', 0) == 1),
+            'near_resistance': bool(features.get('near_resistance', 0) == 1),
         }
         
         if recent_performance:
@@ -111,59 +424,102 @@ class GeminiClient:
         
         return context
     
-    def _determine_trend(self, features: Dict) -> str:
+    def _cache_key(self, context: Dict, candles: List[Dict]) -> Tuple:
+        """Build a hashable key from the bucketed values the prompt is made of"""
+        recent_candles = candles[-5:]
+        directions = tuple(c['close'] > c['open'] for c in recent_candles)
+        
+        perf = context.get('recent_performance')
+        perf_key = None
+        if perf:
+            perf_key = (round(perf.get('win_rate', 0), 3), perf.get('last_10'))
+        
+        return (
+            context['trend'],
+            self._volatility_label(context['volatility']),
+            context['near_support'],
+            context['near_resistance'],
+            tuple(sorted(context['patterns_detected'])),
+            directions,
+            perf_key
+        )
+    
+    @staticmethod
+    def _volatility_label(volatility: float) -> str:
+        """Bucket the volatility ratio the way the prompt reports it"""
+        if volatility > 1.5:
+            return 'HIGH'
+        elif volatility > 0.8:
+            return 'NORMAL'
+        return 'LOW'
+    
+    @staticmethod
+    def _determine_trend(features: Dict) -> str:
         """Determine overall trend from features"""
-        short_slope = features.get('short_term_slope', 0)
-        medium_slope = features.get('medium_term_slope', 0)
-        long_slope = features.get('long_term_slope', 0)
-        
-        avg_slope = (short_slope + medium_slope + long_slope) / 3
-        
-        if avg_slope > 0.0001:
-            return "UPTREND"
-        elif avg_slope < -0.0001:
-            return "DOWNTREND"
-        else:
-            return "SIDEWAYS"
+        slope_sum = (
+            features.get('short_term_slope', 0.0)
+            + features.get('medium_term_slope', 0.0)
+            + features.get('long_term_slope', 0.0)
+        )
+        
+        if slope_sum > _TREND_SLOPE_SUM_THRESHOLD:
+            return TREND_UP
+        if slope_sum < -_TREND_SLOPE_SUM_THRESHOLD:
+            return TREND_DOWN
+        return TREND_SIDEWAYS
     
     def _create_analysis_prompt(self, context: Dict) -> str:
-        """Create prompt for Gemini AI"""
-        prompt = f"""You are an expert binary options trading analyst. Analyze the following market data and provide insights.
-
-**Current Market Context:**
-- Detected Patterns: {', '.join(context['patterns_detected'])}
-- Recent Candles: {' → '.join(context['recent_candles'])}
-- Overall Trend: {context['trend']}
-- Volatility: {'HIGH' if context['volatility'] > 1.5 else 'NORMAL' if context['volatility'] > 0.8 else 'LOW'}
-- Near Support: {'YES' if context['near_support'] else 'NO'}
-- Near Resistance: {'YES' if context['near_resistance'] else 'NO'}
-"""
+        """Create the per-call market block; instructions live in ANALYSIS_SYSTEM_PROMPT"""
+        prompt = MARKET_CONTEXT_TEMPLATE.format(
+            patterns=', '.join(context['patterns_detected']),
+            candles=context['recent_candles'],
+            trend=context['trend'],
+            volatility=self._volatility_label(context['volatility']),
+            near_support=_YES_NO[context['near_support']],
+            near_resistance=_YES_NO[context['near_resistance']]
+        )
 
         if 'recent_performance' in context:
             perf = context['recent_performance']
             prompt += f"\n**Recent Performance:**\n- Win Rate: {perf.get('win_rate', 0):.1%}\n- Last 10 Trades: {perf.get('last_10', 'N/A')}\n"
 
-        prompt += """
-**Your Task:**
-1. Analyze if this looks like broker manipulation (sudden reversals, suspicious patterns)
-2. Predict the next likely move (UP or DOWN)
-3. Provide confidence level (0.0 to 1.0)
-4. Give brief reasoning
-
-**Respond in JSON format:**
-{
-    "prediction": "UP" or "DOWN",
-    "confidence": 0.0-1.0,
-    "reasoning": "brief explanation",
-    "manipulation_detected": true/false,
-    "manipulation_reason": "explanation if detected",
-    "risk_level": "LOW", "MEDIUM", or "HIGH"
-}
-
-Be concise and data-driven. Focus on technical analysis."""
-
         return prompt
     
+    def _create_batch_prompt(self, prompts: List[str]) -> str:
+        """Combine several market blocks into one numbered request"""
+        prompt = (
+            f"Analyze each of the following {len(prompts)} market snapshots independently.\n"
+            f"Respond with a JSON array of {len(prompts)} objects in the same order, "
+            "each using the JSON format above.\n"
+        )
+        
+        for i, block in enumerate(prompts):
+            prompt += f"\n### Snapshot {i+1}\n{block}"
+        
+        return prompt
+    
+    def _parse_batch_response(self, response_text: str, count: int) -> List[Optional[Dict]]:
+        """Split a batched JSON array response back into per-request analyses"""
+        results = [None] * count
+        
+        try:
+            start = response_text.find('[')
+            end = response_text.rfind(']') + 1
+            
+            if start >= 0 and end > start:
+                items = orjson.loads(response_text[start:end])
+                
+                for i, analysis in enumerate(items[:count]):
+                    if isinstance(analysis, dict) and 'prediction' in analysis and 'confidence' in analysis:
+                        results[i] = analysis
+            else:
+                logger.warning("Could not parse batched AI response as JSON array")
+        
+        except Exception as e:
+            logger.error(f"Failed to parse batched AI response: {e}")
+        
+        return results
+    
     def _parse_response(self, response_text: str) -> Dict:
         """Parse AI response"""
         try:
@@ -173,7 +529,7 @@ Be concise and data-driven. Focus on technical analysis."""
             
             if start >= 0 and end > start:
                 json_str = response_text[start:end]
-                analysis = json.loads(json_str)
+                analysis = orjson.loads(json_str)
                 
                 # Validate required fields
                 if 'prediction' in analysis and 'confidence' in analysis:
@@ -242,13 +598,46 @@ Be concise and data-driven. Focus on technical analysis."""
     "recommendation": "advice for trader"
 }"""
 
-            response = self.model.generate_content(prompt)
+            response = await self.model.generate_content_async(prompt)
             return self._parse_response(response.text)
             
         except Exception as e:
             logger.error(f"Manipulation detection failed: {e}")
             return {'manipulation_detected': False, 'confidence': 0.0}
     
+    async def shutdown(self):
+        """Release the async transport used for Gemini requests"""
+        if not self.ready:
+            return
+        
+        self.ready = False
+        
+        if self._batch_worker is not None:
+            self._batch_worker.cancel()
+            self._batch_worker = None
+        self._batch_queue.fail_pending(RuntimeError("Gemini client shut down"))
+        
+        # In-flight calls must finish before the transport below is closed
+        for task in self._batch_calls:
+            task.cancel()
+        await asyncio.gather(*self._batch_calls, return_exceptions=True)
+        
+        if self.context_cache is not None:
+            try:
+                await asyncio.to_thread(self.context_cache.delete)
+            except Exception as e:
+                logger.debug(f"Gemini context cache delete skipped: {e}")
+            self.context_cache = None
+        
+        try:
+            from google.generativeai.client import get_default_generative_async_client
+            
+            client = get_default_generative_async_client()
+            await client.transport.close()
+            logger.info("Gemini AI client closed")
+        except Exception as e:
+            logger.debug(f"Gemini transport close skipped: {e}")
+    
     def is_ready(self) -> bool:
         """Check if client is ready"""
         return self.ready
@@ -258,5 +647,8 @@ Be concise and data-driven. Focus on technical analysis."""
         return {
             'ready': self.ready,
             'model': settings.GEMINI_MODEL,
-            'request_count': self.request_count
+            'context_cached': self.context_cache is not None,
+            'request_count': self.request_count,
+            'cache_hits': self.cache_hits,
+            'cache_size': len(self._cache)
         }
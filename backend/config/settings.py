@@ -12,13 +12,23 @@ class Settings:
     HOST = "0.0.0.0"
     PORT = 8000
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
+    WS_OUTBOUND_QUEUE_SIZE = 64
+    TIMESTAMP_TICK_SECONDS = 0.1
     
     # Gemini AI
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
     GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+    GEMINI_CACHE_SIZE = 512
+    GEMINI_CACHE_TTL_SECONDS = 60
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS = 3600
+    GEMINI_BATCH_MAX_SIZE = 8
+    GEMINI_BATCH_WINDOW_MS = 250
     
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./trading_ai.db")
+    DB_WRITE_BATCH_SIZE = 64
+    DB_WRITE_WINDOW_MS = 100
+    DB_WRITE_QUEUE_SIZE = 1024
     
     # ML Model
     MODEL_PATH = "models/saved"
@@ -34,11 +44,20 @@ class Settings:
     BATCH_SIZE = 32
     LEARNING_RATE = 0.001
     VALIDATION_SPLIT = 0.2
+    TRAIN_DEVICE_RESIDENT_BYTES = 256 * 1024 * 1024  # larger training sets stream from pinned host memory
     RETRAIN_THRESHOLD = 50  # Retrain after N validated predictions
     
     # Prediction
     MIN_CONFIDENCE_THRESHOLD = 0.65
     VALIDATION_DELAY_MINUTES = 2
+    FEATURE_CACHE_SIZE = 128
+    PREDICT_BATCH_MAX_SIZE = 64
+    PREDICT_BATCH_WINDOW_MS = 2
+    USE_ONNX_RUNTIME = True
+    ORT_INTRA_OP_THREADS = 1
+    QUANTIZE_INFERENCE_MODEL = True
+    COMPILE_MODEL = True
+    HALF_PRECISION_INFERENCE = True
     ENSEMBLE_WEIGHTS = {
         "historical": 0.4,
         "ml": 0.6
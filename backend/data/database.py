@@ -2,17 +2,134 @@
 Database Manager - Handles all database operations
 """
 
+import asyncio
+import functools
 import sqlite3
-import json
+import orjson
 import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
-import numpy as np
 
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# On-disk layout of predictions.features_vec
+FEATURE_VEC_DTYPE = '<f4'
+
+# Kinds of queued writes handled by the background writer
+_WRITE_CANDLES = 'candles'
+_WRITE_PREDICTION = 'prediction'
+
+# Hot-path statements, kept as constants so every call hits the same entry
+# in the connection's prepared-statement cache
+_SQL_INSERT_CANDLE = """
+    INSERT INTO candles (timestamp, open, high, low, close, platform)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_RECENT_CANDLES = """
+    SELECT timestamp, open, high, low, close
+    FROM candles
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+_SQL_CANDLES_IN_RANGE = """
+    SELECT timestamp, close
+    FROM candles
+    WHERE timestamp BETWEEN ? AND ?
+    ORDER BY timestamp
+"""
+
+_SQL_INSERT_PREDICTION = """
+    INSERT INTO predictions (
+        id, timestamp, prediction, confidence, features, patterns,
+        method, ai_analysis, features_vec
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# AUTOINCREMENT never reuses ids, so deleted rows still count
+_SQL_LAST_PREDICTION_ID = """
+    SELECT MAX(
+        COALESCE((SELECT MAX(id) FROM predictions), 0),
+        COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'predictions'), 0)
+    ) AS last_id
+"""
+
+_SQL_UNVALIDATED_PREDICTIONS = """
+    SELECT id, timestamp, prediction, confidence, features, patterns
+    FROM predictions
+    WHERE validated = 0 AND timestamp < ?
+    ORDER BY timestamp ASC
+"""
+
+_SQL_VALIDATE_PREDICTION = """
+    UPDATE predictions
+    SET validated = 1, was_correct = ?, actual_outcome = ?,
+        validation_timestamp = ?
+    WHERE id = ?
+"""
+
+_SQL_UPSERT_DAILY_STATISTICS = """
+    INSERT INTO statistics (date, total_predictions, correct_predictions, win_rate)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(date) DO UPDATE SET
+        total_predictions = total_predictions + excluded.total_predictions,
+        correct_predictions = correct_predictions + excluded.correct_predictions,
+        win_rate = CAST(correct_predictions + excluded.correct_predictions AS REAL)
+                   / (total_predictions + excluded.total_predictions)
+"""
+
+_SQL_TRAINING_DATA = """
+    SELECT features_vec, actual_outcome
+    FROM predictions
+    WHERE validated = 1 AND actual_outcome IS NOT NULL
+      AND length(features_vec) = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+_SQL_SIMILAR_PATTERNS = """
+    SELECT p.prediction, p.confidence, p.actual_outcome, p.patterns
+    FROM prediction_patterns pp
+    JOIN predictions p ON p.id = pp.pred_id
+    WHERE pp.pattern = ? AND p.validated = 1
+    ORDER BY p.timestamp DESC
+    LIMIT ?
+"""
+
+_SQL_PERFORMANCE_SINCE = """
+    SELECT SUM(total_predictions) as total,
+           SUM(correct_predictions) as correct
+    FROM statistics
+    WHERE date >= ?
+"""
+
+_SQL_LAST_RESULTS = """
+    SELECT was_correct
+    FROM predictions
+    WHERE validated = 1
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+
+def _run_in_db_thread(method):
+    """
+    Expose a blocking DatabaseManager method as a coroutine
+    
+    The call runs on the manager's single database thread, so SQLite I/O
+    never blocks the event loop and statements stay serialized.
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        return await self._run_sync(method, self, *args, **kwargs)
+    
+    return wrapper
+
 
 class DatabaseManager:
     """Manages SQLite database for candles, predictions, and patterns"""
@@ -20,18 +137,46 @@ class DatabaseManager:
     def __init__(self, db_path: str = "trading_ai.db"):
         self.db_path = db_path
         self.conn = None
-        
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        
+        # Background prediction writer
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._last_prediction_id = 0
+        
+    async def _run_sync(self, func, *args, **kwargs):
+        """Run a blocking call on the database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+    
     def connect(self):
         """Connect to database"""
         try:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=256
+            )
             self.conn.row_factory = sqlite3.Row
+            self._configure_connection()
             self._create_tables()
+            self._last_prediction_id = self.conn.execute(_SQL_LAST_PREDICTION_ID).fetchone()['last_id']
             logger.info(f"Connected to database: {self.db_path}")
         except Exception as e:
             logger.error(f"Database connection failed: {e}")
             raise
     
+    def _configure_connection(self):
+        """Tune SQLite for many small writes from a single process"""
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA mmap_size=268435456")
+        self.conn.execute("PRAGMA cache_size=-65536")
+    
     def _create_tables(self):
         """Create database tables"""
         cursor = self.conn.cursor()
@@ -65,10 +210,16 @@ class DatabaseManager:
                 actual_outcome TEXT,
                 validation_timestamp INTEGER,
                 ai_analysis TEXT,
+                features_vec BLOB,
                 created_at INTEGER DEFAULT (strftime('%s', 'now'))
             )
         """)
         
+        # Databases created before features_vec existed
+        cursor.execute("PRAGMA table_info(predictions)")
+        if 'features_vec' not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE predictions ADD COLUMN features_vec BLOB")
+        
         # Pattern scores table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS pattern_scores (
@@ -94,46 +245,97 @@ class DatabaseManager:
             )
         """)
         
+        # Prediction patterns table (one row per detected pattern), clustered
+        # by pattern so a lookup reads only the matching rows
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS prediction_patterns (
+                pattern TEXT NOT NULL,
+                pred_id INTEGER NOT NULL REFERENCES predictions(id),
+                PRIMARY KEY (pattern, pred_id)
+            ) WITHOUT ROWID
+        """)
+        
+        # Keep prediction_patterns in sync with predictions.patterns
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_predictions_patterns_insert
+            AFTER INSERT ON predictions
+            WHEN NEW.patterns IS NOT NULL
+            BEGIN
+                INSERT OR IGNORE INTO prediction_patterns (pattern, pred_id)
+                SELECT value, NEW.id FROM json_each(NEW.patterns);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_predictions_patterns_delete
+            AFTER DELETE ON predictions
+            BEGIN
+                DELETE FROM prediction_patterns WHERE pred_id = OLD.id;
+            END
+        """)
+        
         # Create indexes
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_candles_timestamp ON candles(timestamp)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions(timestamp)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_validated ON predictions(validated)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pred_val_ts ON predictions(validated, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pred_val_was_ts ON predictions(validated, was_correct, timestamp)")
+        
+        # Backfill daily statistics from predictions validated before they were kept
+        cursor.execute("SELECT COUNT(*) AS count FROM statistics")
+        if cursor.fetchone()['count'] == 0:
+            cursor.execute("""
+                INSERT INTO statistics (date, total_predictions, correct_predictions, win_rate)
+                SELECT date(validation_timestamp / 1000, 'unixepoch', 'localtime'),
+                       COUNT(*),
+                       SUM(CASE WHEN was_correct = 1 THEN 1 ELSE 0 END),
+                       AVG(CASE WHEN was_correct = 1 THEN 1.0 ELSE 0.0 END)
+                FROM predictions
+                WHERE validated = 1 AND validation_timestamp IS NOT NULL
+                GROUP BY 1
+            """)
+        
+        # Backfill patterns for predictions stored before the table existed
+        cursor.execute("SELECT COUNT(*) AS count FROM prediction_patterns")
+        if cursor.fetchone()['count'] == 0:
+            cursor.execute("""
+                INSERT OR IGNORE INTO prediction_patterns (pattern, pred_id)
+                SELECT pattern_list.value, predictions.id
+                FROM predictions, json_each(predictions.patterns) AS pattern_list
+                WHERE predictions.patterns IS NOT NULL
+            """)
         
         self.conn.commit()
         logger.info("Database tables created/verified")
     
     async def store_candles(self, candles: List[Dict], platform: str = "quotex"):
-        """Store candles in database"""
-        cursor = self.conn.cursor()
-        
-        for candle in candles:
-            cursor.execute("""
-                INSERT INTO candles (timestamp, open, high, low, close, platform)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                candle.get('timestamp', int(datetime.now().timestamp() * 1000)),
+        """
+        Store candles in database
+        
+        Rows are handed to the background writer, which inserts them together
+        with other queued writes; falls back to a direct write like
+        store_prediction.
+        """
+        now_ms = int(datetime.now().timestamp() * 1000)
+        
+        rows = [
+            (
+                candle.get('timestamp', now_ms),
                 candle['open'],
                 candle['high'],
                 candle['low'],
                 candle['close'],
                 platform
-            ))
+            )
+            for candle in candles
+        ]
         
-        self.conn.commit()
-        logger.debug(f"Stored {len(candles)} candles")
+        if not await self._enqueue_write((_WRITE_CANDLES, rows)):
+            await self._run_sync(self._write_batch, rows, [])
     
-    async def get_recent_candles(self, count: int = 20) -> List[Dict]:
+    @_run_in_db_thread
+    def get_recent_candles(self, count: int = 20) -> List[Dict]:
         """Get most recent candles"""
-        cursor = self.conn.cursor()
-        
-        cursor.execute("""
-            SELECT timestamp, open, high, low, close
-            FROM candles
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (count,))
-        
-        rows = cursor.fetchall()
+        rows = self.conn.execute(_SQL_RECENT_CANDLES, (count,)).fetchall()
         
         # Convert to list of dicts (reverse to chronological order)
         candles = []
@@ -148,43 +350,151 @@ class DatabaseManager:
         
         return candles
     
-    async def store_prediction(self, prediction: Dict) -> int:
-        """Store prediction"""
-        cursor = self.conn.cursor()
+    @_run_in_db_thread
+    def get_candles_in_range(self, start: int, end: int) -> Dict:
+        """Candles with start <= timestamp <= end as chronological numpy columns ('timestamp', 'close')"""
+        rows = self.conn.execute(_SQL_CANDLES_IN_RANGE, (start, end)).fetchall()
         
-        cursor.execute("""
-            INSERT INTO predictions (
-                timestamp, prediction, confidence, features, patterns,
-                method, ai_analysis
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            int(datetime.now().timestamp() * 1000),
+        return {
+            'timestamp': np.fromiter((row['timestamp'] for row in rows), dtype=np.int64, count=len(rows)),
+            'close': np.fromiter((row['close'] for row in rows), dtype=np.float64, count=len(rows))
+        }
+    
+    async def start_writer(self):
+        """Start the background task that persists queued candles and predictions"""
+        self._write_queue = asyncio.Queue(maxsize=settings.DB_WRITE_QUEUE_SIZE)
+        self._writer_task = asyncio.create_task(self._run_writer())
+        logger.info("Database writer started")
+    
+    async def stop_writer(self):
+        """Flush queued writes and stop the writer"""
+        if self._writer_task is None:
+            return
+        
+        await self._write_queue.join()
+        self._writer_task.cancel()
+        self._writer_task = None
+        logger.info("Database writer stopped")
+    
+    async def store_prediction(self, prediction: Dict) -> int:
+        """
+        Store prediction
+        
+        The row is encoded here, so bad input raises before an id is handed
+        out; the id is then assigned immediately and the row is written by
+        the background writer, so callers don't wait on the commit.
+        Falls back to a direct write when the writer isn't running or its
+        queue stays full.
+        """
+        timestamp = int(datetime.now().timestamp() * 1000)
+        fields = self._encode_prediction(prediction)
+        
+        self._last_prediction_id += 1
+        row = (self._last_prediction_id, timestamp, *fields)
+        
+        if not await self._enqueue_write((_WRITE_PREDICTION, row)):
+            await self._run_sync(self._write_batch, [], [row])
+        return row[0]
+    
+    def _encode_prediction(self, prediction: Dict) -> tuple:
+        """Columns of a predictions row after id and timestamp"""
+        return (
             prediction['prediction'],
             prediction['confidence'],
-            json.dumps(prediction.get('features', {})),
-            json.dumps(prediction.get('patterns', [])),
+            orjson.dumps(prediction.get('features', {}), option=orjson.OPT_SERIALIZE_NUMPY).decode(),
+            orjson.dumps(prediction.get('patterns', [])).decode(),
             prediction.get('method', 'ensemble'),
-            json.dumps(prediction.get('ai_analysis', {}))
-        ))
+            orjson.dumps(prediction.get('ai_analysis', {})).decode(),
+            self._pack_features(prediction.get('feature_array'))
+        )
+    
+    async def _enqueue_write(self, write: tuple) -> bool:
+        """Queue a write for the writer; False if the caller must write directly"""
+        if self._writer_task is None:
+            return False
         
-        self.conn.commit()
-        return cursor.lastrowid
+        try:
+            await asyncio.wait_for(self._write_queue.put(write), 0.01)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Database write queue full, writing directly")
+            return False
     
-    async def get_unvalidated_predictions(self) -> List[Dict]:
-        """Get predictions that need validation"""
-        cursor = self.conn.cursor()
+    async def _run_writer(self):
+        """Collect writes for DB_WRITE_WINDOW_MS, then commit them in one transaction"""
+        window = settings.DB_WRITE_WINDOW_MS / 1000
+        
+        while True:
+            batch = [await self._write_queue.get()]
+            await asyncio.sleep(window)
+            
+            while len(batch) < settings.DB_WRITE_BATCH_SIZE and not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+            
+            candle_rows = []
+            prediction_rows = []
+            for kind, payload in batch:
+                if kind == _WRITE_CANDLES:
+                    candle_rows.extend(payload)
+                else:
+                    prediction_rows.append(payload)
+            
+            try:
+                await self._run_sync(self._write_batch, candle_rows, prediction_rows)
+            except Exception as e:
+                logger.error(
+                    f"Failed to write {len(candle_rows)} candles and {len(prediction_rows)} predictions: {e}",
+                    exc_info=True
+                )
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+    
+    def _write_batch(self, candle_rows: List[tuple], prediction_rows: List[tuple]):
+        """
+        Insert candle rows and prediction rows
+        
+        Each kind gets its own transaction, so a prediction that can't be
+        inserted never takes queued candles down with it.
+        """
+        self._write_rows(_SQL_INSERT_CANDLE, candle_rows)
+        self._write_rows(_SQL_INSERT_PREDICTION, prediction_rows)
         
+        logger.debug(f"Stored {len(candle_rows)} candles and {len(prediction_rows)} predictions")
+    
+    def _write_rows(self, sql: str, rows: List[tuple]):
+        """
+        Insert rows in one transaction
+        
+        If the transaction fails the rows are retried one at a time, so only
+        the rows that can't be inserted are lost.
+        """
+        if not rows:
+            return
+        
+        try:
+            with self.conn:
+                self.conn.executemany(sql, rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Batch write failed, retrying row by row: {e}")
+            self._write_rows_singly(sql, rows)
+    
+    def _write_rows_singly(self, sql: str, rows: List[tuple]):
+        """Insert each row in its own transaction, logging the ones that fail"""
+        for row in rows:
+            try:
+                with self.conn:
+                    self.conn.execute(sql, row)
+            except sqlite3.Error as e:
+                logger.error(f"Dropped row {row[:2]}: {e}")
+    
+    @_run_in_db_thread
+    def get_unvalidated_predictions(self) -> List[Dict]:
+        """Get predictions that need validation"""
         # Get predictions older than validation delay
         cutoff_time = int((datetime.now() - timedelta(minutes=settings.VALIDATION_DELAY_MINUTES)).timestamp() * 1000)
         
-        cursor.execute("""
-            SELECT id, timestamp, prediction, confidence, features, patterns
-            FROM predictions
-            WHERE validated = 0 AND timestamp < ?
-            ORDER BY timestamp ASC
-        """, (cutoff_time,))
-        
-        rows = cursor.fetchall()
+        rows = self.conn.execute(_SQL_UNVALIDATED_PREDICTIONS, (cutoff_time,)).fetchall()
         
         predictions = []
         for row in rows:
@@ -193,76 +503,89 @@ class DatabaseManager:
                 'timestamp': row['timestamp'],
                 'prediction': row['prediction'],
                 'confidence': row['confidence'],
-                'features': json.loads(row['features']),
-                'patterns': json.loads(row['patterns']) if row['patterns'] else []
+                'features': orjson.loads(row['features']),
+                'patterns': orjson.loads(row['patterns']) if row['patterns'] else []
             })
         
         return predictions
     
-    async def validate_prediction(self, prediction_id: int, was_correct: bool, actual_outcome: str):
+    @_run_in_db_thread
+    def validate_prediction(self, prediction_id: int, was_correct: bool, actual_outcome: str):
         """Mark prediction as validated"""
-        cursor = self.conn.cursor()
-        
-        cursor.execute("""
-            UPDATE predictions
-            SET validated = 1, was_correct = ?, actual_outcome = ?,
-                validation_timestamp = ?
-            WHERE id = ?
-        """, (was_correct, actual_outcome, int(datetime.now().timestamp() * 1000), prediction_id))
-        
-        self.conn.commit()
+        self._apply_validations([(prediction_id, was_correct, actual_outcome)])
         logger.debug(f"Validated prediction {prediction_id}: {was_correct}")
     
-    async def get_training_data(self, limit: int = 1000) -> tuple:
+    @_run_in_db_thread
+    def validate_predictions(self, results: List[tuple]):
+        """Mark several (prediction_id, was_correct, actual_outcome) results validated at once"""
+        if results:
+            self._apply_validations(results)
+            logger.debug(f"Validated {len(results)} predictions")
+    
+    def _apply_validations(self, results: List[tuple]):
+        """Update the predictions and today's statistics row in one transaction"""
+        validated_at = int(datetime.now().timestamp() * 1000)
+        correct = sum(1 for _, was_correct, _ in results if was_correct)
+        
+        with self.conn:
+            self.conn.executemany(
+                _SQL_VALIDATE_PREDICTION,
+                [
+                    (was_correct, actual_outcome, validated_at, prediction_id)
+                    for prediction_id, was_correct, actual_outcome in results
+                ]
+            )
+            
+            # Roll the results into today's statistics row
+            self.conn.execute(
+                _SQL_UPSERT_DAILY_STATISTICS,
+                (datetime.now().strftime('%Y-%m-%d'), len(results), correct, correct / len(results))
+            )
+    
+    @staticmethod
+    def _pack_features(feature_array) -> Optional[bytes]:
+        """Serialize a model feature vector as little-endian float32 bytes"""
+        if feature_array is None:
+            return None
+        return np.asarray(feature_array, dtype=FEATURE_VEC_DTYPE).tobytes()
+    
+    @_run_in_db_thread
+    def get_training_data(self, limit: int = 1000) -> tuple:
         """Get validated predictions for training"""
-        cursor = self.conn.cursor()
+        n_features = settings.MODEL_INPUT_FEATURES
         
-        cursor.execute("""
-            SELECT features, actual_outcome
-            FROM predictions
-            WHERE validated = 1 AND actual_outcome IS NOT NULL
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (limit,))
-        
-        rows = cursor.fetchall()
+        rows = self.conn.execute(
+            _SQL_TRAINING_DATA,
+            (n_features * np.dtype(FEATURE_VEC_DTYPE).itemsize, limit)
+        ).fetchall()
         
         if not rows:
             return np.array([]), np.array([])
         
-        X = []
-        y = []
-        
         outcome_map = {'UP': 0, 'DOWN': 1, 'NEUTRAL': 2}
         
-        for row in rows:
-            features = json.loads(row['features'])
-            # Convert features dict to array (simplified)
-            feature_array = [features.get(k, 0) for k in sorted(features.keys())]
-            X.append(feature_array)
-            y.append(outcome_map.get(row['actual_outcome'], 2))
-        
-        return np.array(X), np.array(y)
+        # Stored vectors are fixed-width, so X is a single buffer copy; the
+        # bytearray keeps it writable for callers that hand it to torch
+        X = np.frombuffer(
+            bytearray(b"".join(row['features_vec'] for row in rows)),
+            dtype=FEATURE_VEC_DTYPE
+        ).reshape(-1, n_features)
+        y = np.fromiter(
+            (outcome_map.get(row['actual_outcome'], 2) for row in rows),
+            dtype=np.int64,
+            count=len(rows)
+        )
+        
+        return X, y
     
-    async def find_similar_patterns(self, features: Dict, patterns: List[str], limit: int = 10) -> List[Dict]:
+    @_run_in_db_thread
+    def find_similar_patterns(self, features: Dict, patterns: List[str], limit: int = 10) -> List[Dict]:
         """Find similar historical patterns"""
         # Simplified: just get recent validated predictions with same patterns
-        cursor = self.conn.cursor()
-        
         if not patterns:
             return []
         
-        patterns_json = json.dumps(patterns)
-        
-        cursor.execute("""
-            SELECT prediction, confidence, actual_outcome, patterns
-            FROM predictions
-            WHERE validated = 1 AND patterns LIKE ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (f'%{patterns[0]}%', limit))
-        
-        rows = cursor.fetchall()
+        rows = self.conn.execute(_SQL_SIMILAR_PATTERNS, (patterns[0], limit)).fetchall()
         
         similar = []
         for row in rows:
@@ -271,40 +594,28 @@ class DatabaseManager:
                     'prediction': row['prediction'],
                     'confidence': row['confidence'],
                     'outcome': row['actual_outcome'],
-                    'patterns': json.loads(row['patterns']) if row['patterns'] else []
+                    'patterns': orjson.loads(row['patterns']) if row['patterns'] else []
                 })
         
         return similar
     
-    async def get_recent_performance(self, days: int = 7) -> Dict:
+    @_run_in_db_thread
+    def get_recent_performance(self, days: int = 7) -> Dict:
         """Get recent performance statistics"""
-        cursor = self.conn.cursor()
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
-        cutoff = int((datetime.now() - timedelta(days=days)).timestamp() * 1000)
-        
-        cursor.execute("""
-            SELECT COUNT(*) as total,
-                   SUM(CASE WHEN was_correct = 1 THEN 1 ELSE 0 END) as correct
-            FROM predictions
-            WHERE validated = 1 AND timestamp > ?
-        """, (cutoff,))
-        
-        row = cursor.fetchone()
+        # Daily rollups kept by validate_prediction: O(days) rows, not O(predictions)
+        row = self.conn.execute(_SQL_PERFORMANCE_SINCE, (cutoff,)).fetchone()
         
         total = row['total'] or 0
         correct = row['correct'] or 0
         win_rate = correct / total if total > 0 else 0
         
         # Get last 10 results
-        cursor.execute("""
-            SELECT was_correct
-            FROM predictions
-            WHERE validated = 1
-            ORDER BY timestamp DESC
-            LIMIT 10
-        """)
-        
-        last_10 = ['W' if r['was_correct'] else 'L' for r in cursor.fetchall()]
+        last_10 = [
+            'W' if r['was_correct'] else 'L'
+            for r in self.conn.execute(_SQL_LAST_RESULTS, (10,)).fetchall()
+        ]
         
         return {
             'total': total,
@@ -313,24 +624,21 @@ class DatabaseManager:
             'last_10': ''.join(last_10)
         }
     
-    async def get_stats(self) -> Dict:
+    @_run_in_db_thread
+    def get_stats(self) -> Dict:
         """Get overall statistics"""
-        cursor = self.conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) as count FROM candles")
-        total_candles = cursor.fetchone()['count']
+        total_candles = self.conn.execute("SELECT COUNT(*) as count FROM candles").fetchone()['count']
         
-        cursor.execute("SELECT COUNT(*) as count FROM predictions")
-        total_predictions = cursor.fetchone()['count']
+        total_predictions = self.conn.execute("SELECT COUNT(*) as count FROM predictions").fetchone()['count']
         
-        cursor.execute("SELECT COUNT(*) as count FROM predictions WHERE validated = 1")
-        validated_predictions = cursor.fetchone()['count']
+        validated_predictions = self.conn.execute(
+            "SELECT COUNT(*) as count FROM predictions WHERE validated = 1"
+        ).fetchone()['count']
         
-        cursor.execute("""
+        win_rate = self.conn.execute("""
             SELECT AVG(CASE WHEN was_correct = 1 THEN 1.0 ELSE 0.0 END) as win_rate
             FROM predictions WHERE validated = 1
-        """)
-        win_rate = cursor.fetchone()['win_rate'] or 0
+        """).fetchone()['win_rate'] or 0
         
         return {
             'total_candles': total_candles,
@@ -341,6 +649,8 @@ class DatabaseManager:
     
     def close(self):
         """Close database connection"""
+        self._executor.shutdown(wait=True)
+        
         if self.conn:
             self.conn.close()
             logger.info("Database connection closed")
@@ -3,19 +3,33 @@ Binary Trading AI Agent - Main FastAPI Backend
 Handles all ML/AI processing, predictions, and learning
 """
 
+# Install uvloop before anything creates an event loop (unavailable on Windows)
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    uvloop = None
+
+try:
+    import httptools
+except ImportError:
+    httptools = None
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
 import asyncio
 from datetime import datetime
-import json
-from typing import Dict, List
+import orjson
+import msgspec
+from typing import Dict, Set
 
 # Import our modules
 from config.settings import settings
 from data.database import DatabaseManager
 from ml.neural_network import ModelManager
+from ml import feature_kernel
 from ml.prediction_engine import PredictionEngine
 from ml.learning_system import LearningSystem
 from ai.gemini_client import GeminiClient
@@ -44,16 +58,46 @@ prediction_engine: PredictionEngine = None
 learning_system: LearningSystem = None
 
 # Active WebSocket connections
-active_connections: List[WebSocket] = []
+active_connections: Set[WebSocket] = set()
+
+# Connections that sent binary MessagePack frames and get replies in kind
+msgpack_connections: Set[WebSocket] = set()
+
+# Encoded outbound frames per connection, drained by that connection's sender task
+outbound_queues: Dict[WebSocket, asyncio.Queue] = {}
+
+
+class WSMessage(msgspec.Struct):
+    """Binary WebSocket frame from the extension"""
+    type: str = "UNKNOWN"
+    data: Dict = msgspec.field(default_factory=dict)
+
+
+def _msgpack_default(obj):
+    """Encode numpy scalars/arrays that reach outbound payloads"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise NotImplementedError(f"Cannot encode {type(obj).__name__}")
+
+
+msgpack_encoder = msgspec.msgpack.Encoder(enc_hook=_msgpack_default)
+msgpack_decoder = msgspec.msgpack.Decoder(WSMessage)
 
 # Background tasks
 background_tasks_running = False
+background_stop: asyncio.Event = None
+validation_task: asyncio.Task = None
+timestamp_task: asyncio.Task = None
+
+# Wall-clock ISO timestamp for outgoing messages, refreshed by timestamp_ticker
+current_timestamp: str = datetime.now().isoformat()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle manager for the FastAPI app"""
     # Startup
-    global db_manager, model_manager, gemini_client, prediction_engine, learning_system, background_tasks_running
+    global db_manager, model_manager, gemini_client, prediction_engine, learning_system
+    global background_tasks_running, background_stop, validation_task, timestamp_task
     
     logger.info("=" * 60)
     logger.info("🚀 Starting Binary Trading AI Backend")
@@ -64,16 +108,19 @@ async def lifespan(app: FastAPI):
         logger.info("📊 Initializing database...")
         db_manager = DatabaseManager()
         db_manager.connect()
+        await db_manager.start_writer()
         
         # Initialize ML model
         logger.info("🧠 Initializing neural network...")
         model_manager = ModelManager()
         model_manager.initialize_model()
+        feature_kernel.warmup()
         
         # Initialize Gemini AI
         logger.info("🤖 Initializing Gemini AI...")
         gemini_client = GeminiClient()
         gemini_client.initialize()
+        await gemini_client.warmup()
         
         # Initialize prediction engine
         logger.info("🎯 Initializing prediction engine...")
@@ -84,7 +131,9 @@ async def lifespan(app: FastAPI):
         learning_system = LearningSystem(db_manager, model_manager)
         
         # Start background tasks
-        asyncio.create_task(background_validation_loop())
+        background_stop = asyncio.Event()
+        timestamp_task = asyncio.create_task(timestamp_ticker())
+        validation_task = asyncio.create_task(background_validation_loop())
         
         logger.info("=" * 60)
         logger.info("✅ System initialized successfully!")
@@ -103,7 +152,22 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down...")
     background_tasks_running = False
     
+    if validation_task:
+        # Wakes the loop immediately; a retrain in progress is allowed to finish
+        background_stop.set()
+        await validation_task
+    
+    if timestamp_task:
+        timestamp_task.cancel()
+    
+    if prediction_engine:
+        await prediction_engine.shutdown()
+    
+    if gemini_client:
+        await gemini_client.shutdown()
+    
     if db_manager:
+        await db_manager.stop_writer()
         db_manager.close()
     
     logger.info("Shutdown complete")
@@ -129,49 +193,151 @@ app.add_middleware(
 
 
 
+async def timestamp_ticker():
+    """Refresh current_timestamp so messages reuse one formatted string per tick"""
+    global current_timestamp
+    
+    while True:
+        current_timestamp = datetime.now().isoformat()
+        await asyncio.sleep(settings.TIMESTAMP_TICK_SECONDS)
+
+
+async def wait_for_stop(seconds: float) -> bool:
+    """Sleep up to `seconds`, returning True early if shutdown was requested"""
+    try:
+        await asyncio.wait_for(background_stop.wait(), seconds)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def retrain_and_notify():
+    """Retrain the model and tell connected clients about the new version"""
+    try:
+        logger.info("🎓 Retraining threshold reached")
+        result = await learning_system.retrain_model()
+        
+        if result['success']:
+            logger.info(f"✅ Model retrained successfully: {result['stats']['final_accuracy']:.2%} accuracy")
+            
+            # Notify connected clients
+            await broadcast_to_clients({
+                'type': 'MODEL_RETRAINED',
+                'data': result
+            })
+        else:
+            logger.warning(f"⚠️ Retraining failed: {result.get('reason', 'unknown')}")
+    
+    except Exception as e:
+        logger.error(f"Background retrain error: {e}", exc_info=True)
+
+
 async def background_validation_loop():
-    """Background task for validating predictions"""
+    """
+    Background task for validating predictions
+    
+    Retraining runs as a sibling task, so a long retrain never delays the
+    next validation pass. Leaving the TaskGroup waits for it to finish.
+    """
     global background_tasks_running
     background_tasks_running = True
     
     logger.info("🔄 Background validation loop started")
     
-    while background_tasks_running:
-        try:
-            # Wait 1 minute
-            await asyncio.sleep(60)
-            
-            # Validate predictions
-            await learning_system.validate_predictions()
+    retrain_task = None
+    
+    async with asyncio.TaskGroup() as task_group:
+        while background_tasks_running:
+            # Wait 1 minute (or until shutdown)
+            if await wait_for_stop(60):
+                break
             
-            # Check if retraining needed
-            if await learning_system.should_retrain():
-                logger.info("🎓 Retraining threshold reached")
-                result = await learning_system.retrain_model()
+            try:
+                # Validate predictions
+                await learning_system.validate_predictions()
                 
-                if result['success']:
-                    logger.info(f"✅ Model retrained successfully: {result['stats']['final_accuracy']:.2%} accuracy")
-                    
-                    # Notify connected clients
-                    await broadcast_to_clients({
-                        'type': 'MODEL_RETRAINED',
-                        'data': result
-                    })
-                else:
-                    logger.warning(f"⚠️ Retraining failed: {result.get('reason', 'unknown')}")
+                # Check if retraining needed
+                retrain_idle = retrain_task is None or retrain_task.done()
+                if retrain_idle and await learning_system.should_retrain():
+                    retrain_task = task_group.create_task(retrain_and_notify())
             
-        except Exception as e:
-            logger.error(f"Background task error: {e}", exc_info=True)
-            await asyncio.sleep(60)
+            except Exception as e:
+                logger.error(f"Background task error: {e}", exc_info=True)
+    
+    logger.info("🔄 Background validation loop stopped")
+
+
+async def receive_message(websocket: WebSocket) -> Dict:
+    """Receive a JSON text frame or a MessagePack binary frame"""
+    frame = await websocket.receive()
+    
+    if frame['type'] == 'websocket.disconnect':
+        raise WebSocketDisconnect(frame.get('code', 1000))
+    
+    if frame.get('bytes') is not None:
+        msgpack_connections.add(websocket)
+        message = msgpack_decoder.decode(frame['bytes'])
+        return {'type': message.type, 'data': message.data}
+    
+    return orjson.loads(frame['text'])
+
+
+def encode_message(message: Dict, binary: bool):
+    """Encode a message as a MessagePack (bytes) or JSON text (str) frame"""
+    if binary:
+        return msgpack_encoder.encode(message)
+    return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def enqueue_frame(websocket: WebSocket, frame):
+    """Queue an encoded frame; when a slow client's queue is full its oldest frame is dropped"""
+    queue = outbound_queues.get(websocket)
+    if queue is None:
+        return
+    
+    if queue.full():
+        queue.get_nowait()
+        logger.warning("Outbound queue full, dropped oldest message for slow client")
+    queue.put_nowait(frame)
+
+
+async def drain_outbound(websocket: WebSocket, queue: asyncio.Queue):
+    """Send queued frames in order until the connection fails or is closed"""
+    try:
+        while True:
+            frame = await queue.get()
+            if isinstance(frame, bytes):
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(frame)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.debug(f"Dropping WebSocket after failed send: {e}")
+        drop_connection(websocket)
+
+
+async def send_message(websocket: WebSocket, message: Dict):
+    """Queue a message in the format the client speaks (MessagePack or JSON text)"""
+    enqueue_frame(websocket, encode_message(message, websocket in msgpack_connections))
+
+
+def drop_connection(websocket: WebSocket):
+    """Forget a closed or failed connection"""
+    active_connections.discard(websocket)
+    msgpack_connections.discard(websocket)
+    outbound_queues.pop(websocket, None)
 
 
 async def broadcast_to_clients(message: Dict):
     """Broadcast message to all connected WebSocket clients"""
-    for connection in active_connections:
-        try:
-            await connection.send_json(message)
-        except:
-            pass
+    # Serialize once per wire format; each client's sender task does the I/O
+    frames = {}
+    for connection in list(active_connections):
+        binary = connection in msgpack_connections
+        if binary not in frames:
+            frames[binary] = encode_message(message, binary)
+        enqueue_frame(connection, frames[binary])
 
 
 @app.get("/")
@@ -181,7 +347,7 @@ async def root():
         "status": "running",
         "service": "Binary Trading AI Backend",
         "version": "1.0.0",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": current_timestamp
     }
 
 
@@ -202,7 +368,7 @@ async def get_status():
         "model": model_stats,
         "gemini": gemini_stats,
         "learning": learning_stats,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": current_timestamp
     }
 
 
@@ -213,7 +379,7 @@ async def get_performance():
     
     return {
         "recent_7_days": recent_perf,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": current_timestamp
     }
 
 
@@ -236,25 +402,27 @@ async def trigger_retrain():
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time communication with extension"""
     await websocket.accept()
-    active_connections.append(websocket)
+    active_connections.add(websocket)
+    queue = asyncio.Queue(maxsize=settings.WS_OUTBOUND_QUEUE_SIZE)
+    outbound_queues[websocket] = queue
+    sender = asyncio.create_task(drain_outbound(websocket, queue))
     
     logger.info(f"✅ New WebSocket connection. Total: {len(active_connections)}")
     
     try:
         # Send welcome message
-        await websocket.send_json({
+        await send_message(websocket, {
             "type": "CONNECTION_ESTABLISHED",
             "data": {
                 "message": "Connected to Trading AI Backend",
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": current_timestamp,
                 "system_ready": True
             }
         })
         
         while True:
             # Receive data from extension
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await receive_message(websocket)
             
             message_type = message.get('type', 'UNKNOWN')
             logger.info(f"📨 Received: {message_type}")
@@ -262,17 +430,17 @@ async def websocket_endpoint(websocket: WebSocket):
             # Handle different message types
             if message_type == "CANDLES_UPDATE":
                 response = await handle_candles_update(message['data'])
-                await websocket.send_json(response)
+                await send_message(websocket, response)
                 
             elif message_type == "PING":
-                await websocket.send_json({
+                await send_message(websocket, {
                     "type": "PONG",
-                    "data": {"timestamp": datetime.now().isoformat()}
+                    "data": {"timestamp": current_timestamp}
                 })
                 
             elif message_type == "GET_STATUS":
                 status = await get_status()
-                await websocket.send_json({
+                await send_message(websocket, {
                     "type": "STATUS",
                     "data": status
                 })
@@ -285,19 +453,21 @@ async def websocket_endpoint(websocket: WebSocket):
                 
             else:
                 logger.warning(f"Unknown message type: {message_type}")
-                await websocket.send_json({
+                await send_message(websocket, {
                     "type": "ERROR",
                     "data": {"message": f"Unknown message type: {message_type}"}
                 })
                 
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        drop_connection(websocket)
         logger.info(f"❌ WebSocket disconnected. Remaining: {len(active_connections)}")
         
     except Exception as e:
         logger.error(f"WebSocket error: {e}", exc_info=True)
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        drop_connection(websocket)
+    
+    finally:
+        sender.cancel()
 
 
 async def handle_candles_update(data: Dict) -> Dict:
@@ -369,7 +539,7 @@ async def handle_candles_update(data: Dict) -> Dict:
             "type": "ERROR",
             "data": {
                 "message": str(e),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": current_timestamp
             }
         }
 
@@ -384,5 +554,8 @@ if __name__ == "__main__":
         app,
         host=settings.HOST,
         port=settings.PORT,
+        loop="uvloop" if uvloop else "asyncio",
+        http="httptools" if httptools else "h11",
+        ws="websockets",
         log_level=settings.LOG_LEVEL.lower()
     )
@@ -3,15 +3,142 @@ Feature Extractor - Extracts numerical features from candlestick patterns
 """
 
 import numpy as np
-from typing import List, Dict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from scipy import stats
+from cachetools import LRUCache
+
+from config.settings import settings
+from ml.feature_kernel import NUMBA_AVAILABLE, compute_features
+
+
+# Layout of features_to_array: scalars, then a fixed tail of each series
+_SCALAR_KEYS = (
+    'avg_body_ratio', 'avg_upper_wick', 'avg_lower_wick',
+    'short_term_slope', 'medium_term_slope', 'long_term_slope',
+    'atr', 'volatility_ratio',
+    'consecutive_bullish', 'consecutive_bearish',
+    'higher_highs_count', 'lower_lows_count',
+    'near_resistance', 'near_support',
+    'dist_to_resistance', 'dist_to_support'
+)
+_SCALAR_INDEX = {key: i for i, key in enumerate(_SCALAR_KEYS)}
+_SERIES_KEYS = ('body_ratios', 'body_directions', 'upper_wick_ratios', 'lower_wick_ratios')
+SERIES_LENGTH = 11
+# Scalars that are counts or flags rather than measurements
+_INT_SCALAR_KEYS = frozenset((
+    'consecutive_bullish', 'consecutive_bearish',
+    'higher_highs_count', 'lower_lows_count',
+    'near_resistance', 'near_support'
+))
+
+# Windows for the short/medium trend slopes; the long slope uses every candle
+_SHORT_TREND_WINDOW = 5
+_MEDIUM_TREND_WINDOW = 10
+
+
+def _ols_slope_weights(n: int) -> np.ndarray:
+    """Weights w such that w @ y is the least-squares slope of y over 0..n-1"""
+    x = np.arange(n, dtype=np.float64)
+    x -= x.mean()
+    return x / np.dot(x, x)
+
+
+@lru_cache(maxsize=8)
+def _trend_weights(n: int) -> np.ndarray:
+    """
+    (3, n) matrix whose product with n closes gives the short, medium and
+    long-term slopes; rows are zero-padded on the left, and a window longer
+    than the series gets an all-zero row (slope 0)
+    """
+    weights = np.zeros((3, n))
+    for row, window in enumerate((_SHORT_TREND_WINDOW, _MEDIUM_TREND_WINDOW, n)):
+        if 2 <= window <= n:
+            weights[row, n - window:] = _ols_slope_weights(window)
+    weights.setflags(write=False)
+    return weights
+
+
+@dataclass(slots=True)
+class FeatureSet:
+    """Extracted features: scalars in _SCALAR_KEYS order plus the per-candle series"""
+    scalars: np.ndarray
+    body_ratios: np.ndarray
+    body_directions: np.ndarray
+    upper_wick_ratios: np.ndarray
+    lower_wick_ratios: np.ndarray
+    
+    def get(self, key: str, default=None):
+        """Dict-style lookup of a feature by name"""
+        index = _SCALAR_INDEX.get(key)
+        if index is not None:
+            value = self.scalars[index].item()
+            return int(value) if key in _INT_SCALAR_KEYS else value
+        if key in _SERIES_KEYS:
+            return getattr(self, key)
+        return default
+    
+    def to_dict(self) -> Dict:
+        """Features as the name -> value dictionary stored with predictions"""
+        features = {
+            key: int(value) if key in _INT_SCALAR_KEYS else value
+            for key, value in zip(_SCALAR_KEYS, self.scalars.tolist())
+        }
+        for key in _SERIES_KEYS:
+            features[key] = getattr(self, key)
+        return features
 
 
 class FeatureExtractor:
     """Extract features from candlestick data for ML model"""
     
+    def __init__(self):
+        # Candle window key -> (features, feature_array)
+        self._cache = LRUCache(maxsize=settings.FEATURE_CACHE_SIZE)
+    
+    def extract(self, candles: List[Dict]) -> Tuple[FeatureSet, np.ndarray]:
+        """
+        extract_features + features_to_array, memoized per candle window
+        
+        Bursts of updates often resend a window whose candles have not changed;
+        those reuse the previous result. Callers must not mutate what is returned.
+        """
+        key = self._window_key(candles)
+        if key is not None:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+        
+        features = self.extract_features(candles)
+        result = (features, self.features_to_array(features))
+        
+        if key is not None:
+            self._cache[key] = result
+        return result
+    
+    @staticmethod
+    def _window_key(candles: List[Dict]) -> Optional[Tuple]:
+        """
+        Identify the 20-candle window by its first timestamp and its last candle
+        
+        Closed candles do not change, so only the live (last) candle's prices
+        need to be in the key. Windows without timestamps are not cached.
+        """
+        if len(candles) < 20:
+            return None
+        
+        first, last = candles[-20], candles[-1]
+        if first.get('timestamp') is None or last.get('timestamp') is None:
+            return None
+        
+        return (
+            first['timestamp'], last['timestamp'],
+            last['open'], last['high'], last['low'], last['close']
+        )
+    
     @staticmethod
-    def extract_features(candles: List[Dict]) -> Dict:
+    def extract_features(candles: List[Dict]) -> FeatureSet:
         """
         Extract comprehensive features from candles
         
@@ -19,268 +146,167 @@ class FeatureExtractor:
             candles: List of candle dictionaries with OHLC data
             
         Returns:
-            Dictionary of extracted features
+            FeatureSet of extracted features (to_dict() for the named form)
         """
         if len(candles) < 20:
             raise ValueError("Need at least 20 candles for feature extraction")
         
-        # Take last 20 candles
-        recent_candles = candles[-20:]
-        
-        features = {}
-        
-        # 1. Candle Body Features
-        features.update(FeatureExtractor._extract_body_features(recent_candles))
+        # Take last 20 candles as one OHLC array
+        ohlc = FeatureExtractor._candles_to_soa(candles[-20:])
         
-        # 2. Wick Features
-        features.update(FeatureExtractor._extract_wick_features(recent_candles))
-        
-        # 3. Trend Features
-        features.update(FeatureExtractor._extract_trend_features(recent_candles))
-        
-        # 4. Volatility Features
-        features.update(FeatureExtractor._extract_volatility_features(recent_candles))
-        
-        # 5. Pattern Features
-        features.update(FeatureExtractor._extract_pattern_features(recent_candles))
-        
-        # 6. Support/Resistance Features
-        features.update(FeatureExtractor._extract_support_resistance(recent_candles))
-        
-        return features
+        if NUMBA_AVAILABLE:
+            return FeatureExtractor._extract_compiled(ohlc)
+        return FeatureExtractor._extract_all(ohlc)
     
     @staticmethod
-    def _extract_body_features(candles: List[Dict]) -> Dict:
-        """Extract candle body characteristics"""
-        features = {}
-        
-        body_ratios = []
-        body_directions = []
-        
-        for candle in candles:
-            o, h, l, c = candle['open'], candle['high'], candle['low'], candle['close']
-            
-            # Body ratio: (close - open) / (high - low)
-            range_val = h - l
-            if range_val > 0:
-                body_ratio = abs(c - o) / range_val
-            else:
-                body_ratio = 0
-            
-            body_ratios.append(body_ratio)
-            
-            # Direction: 1 for bullish, -1 for bearish
-            body_directions.append(1 if c > o else -1)
-        
-        features['body_ratios'] = body_ratios
-        features['body_directions'] = body_directions
-        features['avg_body_ratio'] = np.mean(body_ratios)
+    def _candles_to_soa(candles: List[Dict]) -> np.ndarray:
+        """
+        Convert candle dicts to a (4, N) array with rows open, high, low, close
         
-        return features
+        Kept in float64: slopes and body sizes are differences of nearly equal
+        prices, which float32 cannot resolve for 5-digit quotes.
+        """
+        ohlc = np.array(
+            [(c['open'], c['high'], c['low'], c['close']) for c in candles],
+            dtype=np.float64
+        )
+        return np.ascontiguousarray(ohlc.T)
     
     @staticmethod
-    def _extract_wick_features(candles: List[Dict]) -> Dict:
-        """Extract wick characteristics"""
-        features = {}
-        
-        upper_wick_ratios = []
-        lower_wick_ratios = []
-        
-        for candle in candles:
-            o, h, l, c = candle['open'], candle['high'], candle['low'], candle['close']
-            
-            body_top = max(o, c)
-            body_bottom = min(o, c)
-            range_val = h - l
-            
-            if range_val > 0:
-                upper_wick = (h - body_top) / range_val
-                lower_wick = (body_bottom - l) / range_val
-            else:
-                upper_wick = 0
-                lower_wick = 0
-            
-            upper_wick_ratios.append(upper_wick)
-            lower_wick_ratios.append(lower_wick)
-        
-        features['upper_wick_ratios'] = upper_wick_ratios
-        features['lower_wick_ratios'] = lower_wick_ratios
-        features['avg_upper_wick'] = np.mean(upper_wick_ratios)
-        features['avg_lower_wick'] = np.mean(lower_wick_ratios)
-        
-        return features
+    def _max_runs(mask: np.ndarray) -> Tuple[int, int]:
+        """Longest runs of True and of False values, from one run-length encoding"""
+        n = mask.size
+        if n == 0:
+            return 0, 0
+        
+        # Runs start where the value changes
+        starts = np.flatnonzero(np.concatenate(([True], mask[1:] != mask[:-1])))
+        lengths = np.diff(starts, append=n)
+        true_runs = mask[starts]
+        
+        return (
+            int(lengths[true_runs].max(initial=0)),
+            int(lengths[~true_runs].max(initial=0))
+        )
     
     @staticmethod
-    def _extract_trend_features(candles: List[Dict]) -> Dict:
-        """Extract trend indicators"""
-        features = {}
-        
-        closes = np.array([c['close'] for c in candles])
+    def _extract_compiled(ohlc: np.ndarray) -> FeatureSet:
+        """Same features as _extract_all, computed by the Numba kernel"""
+        scalars, series = compute_features(ohlc)
+        
+        return FeatureSet(
+            scalars=scalars,
+            body_ratios=series[0],
+            body_directions=series[1].astype(np.int64),
+            upper_wick_ratios=series[2],
+            lower_wick_ratios=series[3]
+        )
+    
+    @staticmethod
+    def _extract_all(ohlc: np.ndarray) -> FeatureSet:
+        """Compute every feature group from one OHLC array, sharing intermediates"""
+        o, h, l, c = ohlc
         
-        # Short-term slope (last 5 candles)
-        if len(closes) >= 5:
-            x = np.arange(5)
-            y = closes[-5:]
-            slope, _ = np.polyfit(x, y, 1)
-            features['short_term_slope'] = slope
-        else:
-            features['short_term_slope'] = 0
+        # Shared intermediates
+        range_val = h - l
+        has_range = range_val > 0
+        bullish = c > o
+        body_top = np.maximum(o, c)
+        body_bottom = np.minimum(o, c)
         
-        # Medium-term slope (last 10 candles)
-        if len(closes) >= 10:
-            x = np.arange(10)
-            y = closes[-10:]
-            slope, _ = np.polyfit(x, y, 1)
-            features['medium_term_slope'] = slope
-        else:
-            features['medium_term_slope'] = 0
+        # 1. Candle Body Features
+        # Body ratio: |close - open| / (high - low), 0 for flat candles
+        body_ratios = np.divide(
+            body_top - body_bottom, range_val,
+            out=np.zeros_like(range_val), where=has_range
+        )
+        # Direction: 1 for bullish, -1 for bearish
+        body_directions = np.where(bullish, 1, -1)
         
-        # Long-term slope (all 20 candles)
-        x = np.arange(len(closes))
-        slope, _ = np.polyfit(x, closes, 1)
-        features['long_term_slope'] = slope
+        # 2. Wick Features
+        upper_wick_ratios = np.divide(
+            h - body_top, range_val,
+            out=np.zeros_like(range_val), where=has_range
+        )
+        lower_wick_ratios = np.divide(
+            body_bottom - l, range_val,
+            out=np.zeros_like(range_val), where=has_range
+        )
         
-        return features
-    
-    @staticmethod
-    def _extract_volatility_features(candles: List[Dict]) -> Dict:
-        """Extract volatility metrics"""
-        features = {}
+        # 3. Trend Features
+        # Short (5), medium (10) and long-term (all) slopes in one product
+        short_slope, medium_slope, long_slope = _trend_weights(len(c)) @ c
         
+        # 4. Volatility Features
         # Average True Range (ATR)
-        true_ranges = []
-        for i in range(1, len(candles)):
-            h = candles[i]['high']
-            l = candles[i]['low']
-            prev_close = candles[i-1]['close']
-            
-            tr = max(
-                h - l,
-                abs(h - prev_close),
-                abs(l - prev_close)
-            )
-            true_ranges.append(tr)
-        
-        features['atr'] = np.mean(true_ranges) if true_ranges else 0
+        prev_close = c[:-1]
+        true_ranges = np.maximum.reduce([
+            range_val[1:],
+            np.abs(h[1:] - prev_close),
+            np.abs(l[1:] - prev_close)
+        ])
+        atr = true_ranges.mean() if true_ranges.size else 0
         
         # Volatility ratio (current ATR vs average)
-        if len(true_ranges) > 5:
-            recent_atr = np.mean(true_ranges[-5:])
-            avg_atr = np.mean(true_ranges)
-            features['volatility_ratio'] = recent_atr / avg_atr if avg_atr > 0 else 1
+        if true_ranges.size > 5 and atr > 0:
+            volatility_ratio = true_ranges[-5:].mean() / atr
         else:
-            features['volatility_ratio'] = 1
-        
-        return features
-    
-    @staticmethod
-    def _extract_pattern_features(candles: List[Dict]) -> Dict:
-        """Extract pattern-based features"""
-        features = {}
+            volatility_ratio = 1
         
-        # Consecutive bullish/bearish candles
-        consecutive_bullish = 0
-        consecutive_bearish = 0
-        current_streak_bullish = 0
-        current_streak_bearish = 0
-        
-        for candle in candles:
-            if candle['close'] > candle['open']:
-                current_streak_bullish += 1
-                current_streak_bearish = 0
-            else:
-                current_streak_bearish += 1
-                current_streak_bullish = 0
-            
-            consecutive_bullish = max(consecutive_bullish, current_streak_bullish)
-            consecutive_bearish = max(consecutive_bearish, current_streak_bearish)
-        
-        features['consecutive_bullish'] = consecutive_bullish
-        features['consecutive_bearish'] = consecutive_bearish
+        # 5. Pattern Features
+        # Longest bullish/bearish streaks
+        consecutive_bullish, consecutive_bearish = FeatureExtractor._max_runs(bullish)
         
         # Higher highs / Lower lows
-        highs = [c['high'] for c in candles]
-        lows = [c['low'] for c in candles]
+        higher_highs_count = np.count_nonzero(h[1:] > h[:-1])
+        lower_lows_count = np.count_nonzero(l[1:] < l[:-1])
         
-        higher_highs = sum(1 for i in range(1, len(highs)) if highs[i] > highs[i-1])
-        lower_lows = sum(1 for i in range(1, len(lows)) if lows[i] < lows[i-1])
-        
-        features['higher_highs_count'] = higher_highs
-        features['lower_lows_count'] = lower_lows
-        
-        return features
-    
-    @staticmethod
-    def _extract_support_resistance(candles: List[Dict]) -> Dict:
-        """Extract support/resistance features"""
-        features = {}
-        
-        closes = [c['close'] for c in candles]
-        highs = [c['high'] for c in candles]
-        lows = [c['low'] for c in candles]
-        
-        current_price = closes[-1]
+        # 6. Support/Resistance Features
+        current_price = c[-1]
         
         # Recent high/low (last 10 candles)
-        recent_high = max(highs[-10:])
-        recent_low = min(lows[-10:])
+        recent_high = h[-10:].max()
+        recent_low = l[-10:].min()
         
         # Distance to recent high/low (as percentage)
-        if recent_high > 0:
-            dist_to_resistance = (recent_high - current_price) / recent_high
-        else:
-            dist_to_resistance = 0
-        
-        if recent_low > 0:
-            dist_to_support = (current_price - recent_low) / recent_low
-        else:
-            dist_to_support = 0
-        
-        features['near_resistance'] = 1 if dist_to_resistance < 0.02 else 0  # Within 2%
-        features['near_support'] = 1 if dist_to_support < 0.02 else 0  # Within 2%
-        features['dist_to_resistance'] = dist_to_resistance
-        features['dist_to_support'] = dist_to_support
-        
-        return features
+        dist_to_resistance = (recent_high - current_price) / recent_high if recent_high > 0 else 0
+        dist_to_support = (current_price - recent_low) / recent_low if recent_low > 0 else 0
+        
+        # In _SCALAR_KEYS order
+        scalars = np.array([
+            body_ratios.mean(), upper_wick_ratios.mean(), lower_wick_ratios.mean(),
+            short_slope, medium_slope, long_slope,
+            atr, volatility_ratio,
+            consecutive_bullish, consecutive_bearish,
+            higher_highs_count, lower_lows_count,
+            dist_to_resistance < 0.02, dist_to_support < 0.02,  # Within 2%
+            dist_to_resistance, dist_to_support
+        ], dtype=np.float64)
+        
+        return FeatureSet(
+            scalars=scalars,
+            body_ratios=body_ratios,
+            body_directions=body_directions,
+            upper_wick_ratios=upper_wick_ratios,
+            lower_wick_ratios=lower_wick_ratios
+        )
     
     @staticmethod
-    def features_to_array(features: Dict) -> np.ndarray:
+    def features_to_array(features: FeatureSet) -> np.ndarray:
         """
-        Convert feature dictionary to numpy array for ML model
+        Convert a FeatureSet to the numpy array fed to the ML model
         
         Returns:
-            1D numpy array of features
+            1D float32 array: the scalars, then the last SERIES_LENGTH values
+            of each per-candle series
         """
-        feature_array = []
-        
-        # Add scalar features
-        scalar_keys = [
-            'avg_body_ratio', 'avg_upper_wick', 'avg_lower_wick',
-            'short_term_slope', 'medium_term_slope', 'long_term_slope',
-            'atr', 'volatility_ratio',
-            'consecutive_bullish', 'consecutive_bearish',
-            'higher_highs_count', 'lower_lows_count',
-            'near_resistance', 'near_support',
-            'dist_to_resistance', 'dist_to_support'
-        ]
-        
-        for key in scalar_keys:
-            feature_array.append(features.get(key, 0))
-        
-        # Add last 11 body ratios
-        body_ratios = features.get('body_ratios', [0] * 20)
-        feature_array.extend(body_ratios[-11:])
-        
-        # Add last 11 body directions
-        body_directions = features.get('body_directions', [0] * 20)
-        feature_array.extend(body_directions[-11:])
-        
-        # Add last 11 upper wick ratios
-        upper_wicks = features.get('upper_wick_ratios', [0] * 20)
-        feature_array.extend(upper_wicks[-11:])
-        
-        # Add last 11 lower wick ratios
-        lower_wicks = features.get('lower_wick_ratios', [0] * 20)
-        feature_array.extend(lower_wicks[-11:])
-        
-        return np.array(feature_array, dtype=np.float32)
+        return np.concatenate(
+            (
+                features.scalars,
+                features.body_ratios[-SERIES_LENGTH:],
+                features.body_directions[-SERIES_LENGTH:],
+                features.upper_wick_ratios[-SERIES_LENGTH:],
+                features.lower_wick_ratios[-SERIES_LENGTH:]
+            ),
+            dtype=np.float32
+        )
@@ -0,0 +1,263 @@
+"""
+Feature Kernel - Numba-compiled single pass over an OHLC array
+
+Mirrors FeatureExtractor._extract_all and the PatternDetector predicates.
+For 20 candles NumPy's per-call dispatch costs more than the arithmetic,
+so explicit compiled loops win. Numba is optional; without it
+FeatureExtractor and PatternDetector keep their NumPy/Python paths.
+"""
+
+import logging
+import time
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in decorator so the kernel stays importable without Numba"""
+        def wrap(func):
+            return func
+        return wrap
+
+logger = logging.getLogger(__name__)
+
+# Slots of the scalar output, in FeatureExtractor's _SCALAR_KEYS order
+N_SCALARS = 16
+# Rows of the series output
+N_SERIES = 4
+
+_SHORT_TREND_WINDOW = 5
+_MEDIUM_TREND_WINDOW = 10
+
+
+@njit(cache=True, fastmath=True)
+def _slope(closes, window):
+    """Least-squares slope of the last `window` closes (0 if too short)"""
+    n = closes.shape[0]
+    if window < 2 or window > n:
+        return 0.0
+    x_mean = (window - 1) / 2.0
+    sxx = window * (window * window - 1) / 12.0
+    acc = 0.0
+    start = n - window
+    for i in range(window):
+        acc += (i - x_mean) * closes[start + i]
+    return acc / sxx
+
+
+@njit(cache=True, fastmath=True)
+def compute_features(ohlc):
+    """
+    Compute candle features from a (4, N) open/high/low/close array
+
+    Returns:
+        (scalars, series): 16 scalars in _SCALAR_KEYS order and a (4, N)
+        array of body ratios, body directions, upper and lower wick ratios
+    """
+    n = ohlc.shape[1]
+    o = ohlc[0]
+    h = ohlc[1]
+    l = ohlc[2]
+    c = ohlc[3]
+
+    scalars = np.zeros(N_SCALARS)
+    series = np.zeros((N_SERIES, n))
+
+    body_sum = 0.0
+    upper_sum = 0.0
+    lower_sum = 0.0
+    tr_sum = 0.0
+    tr_recent_sum = 0.0
+    bull_run = 0
+    bear_run = 0
+    max_bull = 0
+    max_bear = 0
+    higher_highs = 0
+    lower_lows = 0
+
+    for i in range(n):
+        oi = o[i]
+        hi = h[i]
+        li = l[i]
+        ci = c[i]
+        range_val = hi - li
+        bullish = ci > oi
+        body_top = ci if bullish else oi
+        body_bottom = oi if bullish else ci
+
+        if range_val > 0:
+            body_ratio = (body_top - body_bottom) / range_val
+            upper_wick = (hi - body_top) / range_val
+            lower_wick = (body_bottom - li) / range_val
+        else:
+            body_ratio = 0.0
+            upper_wick = 0.0
+            lower_wick = 0.0
+
+        series[0, i] = body_ratio
+        series[1, i] = 1.0 if bullish else -1.0
+        series[2, i] = upper_wick
+        series[3, i] = lower_wick
+        body_sum += body_ratio
+        upper_sum += upper_wick
+        lower_sum += lower_wick
+
+        if bullish:
+            bull_run += 1
+            bear_run = 0
+        else:
+            bear_run += 1
+            bull_run = 0
+        max_bull = max(max_bull, bull_run)
+        max_bear = max(max_bear, bear_run)
+
+        if i > 0:
+            prev_close = c[i - 1]
+            tr = max(range_val, abs(hi - prev_close), abs(li - prev_close))
+            tr_sum += tr
+            if i >= n - 5:
+                tr_recent_sum += tr
+            if hi > h[i - 1]:
+                higher_highs += 1
+            if li < l[i - 1]:
+                lower_lows += 1
+
+    scalars[0] = body_sum / n
+    scalars[1] = upper_sum / n
+    scalars[2] = lower_sum / n
+
+    scalars[3] = _slope(c, _SHORT_TREND_WINDOW)
+    scalars[4] = _slope(c, _MEDIUM_TREND_WINDOW)
+    scalars[5] = _slope(c, n)
+
+    n_tr = n - 1
+    atr = tr_sum / n_tr if n_tr > 0 else 0.0
+    scalars[6] = atr
+    if n_tr > 5 and atr > 0:
+        scalars[7] = (tr_recent_sum / 5) / atr
+    else:
+        scalars[7] = 1.0
+
+    scalars[8] = max_bull
+    scalars[9] = max_bear
+    scalars[10] = higher_highs
+    scalars[11] = lower_lows
+
+    # Support/resistance over the last 10 candles
+    current_price = c[n - 1]
+    recent_high = h[max(0, n - 10)]
+    recent_low = l[max(0, n - 10)]
+    for i in range(max(0, n - 10), n):
+        recent_high = max(recent_high, h[i])
+        recent_low = min(recent_low, l[i])
+
+    dist_to_resistance = (recent_high - current_price) / recent_high if recent_high > 0 else 0.0
+    dist_to_support = (current_price - recent_low) / recent_low if recent_low > 0 else 0.0
+
+    scalars[12] = 1.0 if dist_to_resistance < 0.02 else 0.0
+    scalars[13] = 1.0 if dist_to_support < 0.02 else 0.0
+    scalars[14] = dist_to_resistance
+    scalars[15] = dist_to_support
+
+    return scalars, series
+
+
+# Bits of the detect_patterns mask, in PatternDetector.PATTERNS order
+_HAMMER = 1 << 0
+_INVERTED_HAMMER = 1 << 1
+_DOJI = 1 << 2
+_DRAGONFLY_DOJI = 1 << 3
+_GRAVESTONE_DOJI = 1 << 4
+_BULLISH_ENGULFING = 1 << 5
+_BEARISH_ENGULFING = 1 << 6
+_BULLISH_HARAMI = 1 << 7
+_BEARISH_HARAMI = 1 << 8
+_MORNING_STAR = 1 << 9
+_EVENING_STAR = 1 << 10
+_THREE_WHITE_SOLDIERS = 1 << 11
+_THREE_BLACK_CROWS = 1 << 12
+
+
+@njit(cache=True)
+def detect_patterns(ohlc):
+    """
+    Evaluate every PatternDetector predicate on the last three candles
+    
+    Args:
+        ohlc: (4, 3) open/high/low/close array, oldest candle first
+        
+    Returns:
+        Bitmask with one bit per pattern in PatternDetector.PATTERNS
+    """
+    o = ohlc[0]
+    h = ohlc[1]
+    l = ohlc[2]
+    c = ohlc[3]
+    mask = 0
+
+    # Single candle patterns
+    total_range = h[2] - l[2]
+    if total_range != 0:
+        body = abs(c[2] - o[2])
+        lower_shadow = min(o[2], c[2]) - l[2]
+        upper_shadow = h[2] - max(o[2], c[2])
+        small_body = body < total_range * 0.3
+        doji = body / total_range < 0.1
+
+        if lower_shadow > body * 2 and upper_shadow < body * 0.3 and small_body:
+            mask |= _HAMMER
+        if upper_shadow > body * 2 and lower_shadow < body * 0.3 and small_body:
+            mask |= _INVERTED_HAMMER
+        if doji:
+            mask |= _DOJI
+            if lower_shadow > total_range * 0.6 and upper_shadow < total_range * 0.1:
+                mask |= _DRAGONFLY_DOJI
+            if upper_shadow > total_range * 0.6 and lower_shadow < total_range * 0.1:
+                mask |= _GRAVESTONE_DOJI
+
+    # Two candle patterns
+    prev_bullish = c[1] > o[1]
+    prev_bearish = c[1] < o[1]
+    curr_bullish = c[2] > o[2]
+    curr_bearish = c[2] < o[2]
+
+    if prev_bearish and curr_bullish:
+        if o[2] < c[1] and c[2] > o[1]:
+            mask |= _BULLISH_ENGULFING
+        if o[2] > c[1] and c[2] < o[1]:
+            mask |= _BULLISH_HARAMI
+    if prev_bullish and curr_bearish:
+        if o[2] > c[1] and c[2] < o[1]:
+            mask |= _BEARISH_ENGULFING
+        if o[2] < c[1] and c[2] > o[1]:
+            mask |= _BEARISH_HARAMI
+
+    # Three candle patterns
+    second_small = abs(c[1] - o[1]) < abs(c[0] - o[0]) * 0.5
+    if second_small and c[0] < o[0] and curr_bullish:
+        mask |= _MORNING_STAR
+    if second_small and c[0] > o[0] and curr_bearish:
+        mask |= _EVENING_STAR
+    if c[0] > o[0] and prev_bullish and curr_bullish and c[1] > c[0] and c[2] > c[1]:
+        mask |= _THREE_WHITE_SOLDIERS
+    if c[0] < o[0] and prev_bearish and curr_bearish and c[1] < c[0] and c[2] < c[1]:
+        mask |= _THREE_BLACK_CROWS
+
+    return mask
+
+
+def warmup():
+    """Load (or compile and cache) the kernel before the first candle arrives"""
+    if not NUMBA_AVAILABLE:
+        logger.info("Numba not installed, using NumPy feature extraction")
+        return
+
+    start = time.perf_counter()
+    compute_features(np.ones((N_SERIES, 20)))
+    detect_patterns(np.ones((N_SERIES, 3)))
+    logger.info(f"Feature kernel ready in {time.perf_counter() - start:.2f}s")
@@ -2,9 +2,11 @@
 Learning System - Handles prediction validation and model retraining
 """
 
+import asyncio
 import logging
+import numpy as np
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 from data.database import DatabaseManager
 from ml.neural_network import ModelManager
@@ -35,79 +37,107 @@ class LearningSystem:
             
             logger.info(f"Validating {len(predictions)} predictions")
             
-            for pred in predictions:
-                await self._validate_single_prediction(pred)
+            # One candle window covering every prediction in this pass
+            pred_times = [pred['timestamp'] for pred in predictions]
+            candles = await self.db.get_candles_in_range(
+                min(pred_times) - 120_000,
+                max(pred_times) + settings.VALIDATION_DELAY_MINUTES * 60 * 1000 + 120_000
+            )
+            
+            # Candle matching runs off the event loop
+            outcomes = await asyncio.to_thread(self._resolve_outcomes, predictions, candles)
+            
+            await self._record_validations(
+                [(pred, actual_outcome) for pred, actual_outcome in outcomes if actual_outcome is not None]
+            )
             
             logger.info(f"Validated {len(predictions)} predictions")
             
         except Exception as e:
             logger.error(f"Validation failed: {e}", exc_info=True)
     
-    async def _validate_single_prediction(self, prediction: Dict):
-        """Validate a single prediction"""
+    @staticmethod
+    def _resolve_outcomes(
+        predictions: List[Dict],
+        candles: Dict[str, np.ndarray]
+    ) -> List[Tuple[Dict, Optional[str]]]:
+        """Pair each prediction with its actual outcome (None if candles are missing)"""
+        timestamps = candles['timestamp']
+        closes = candles['close']
+        n = len(timestamps)
+        
+        if n == 0:
+            for pred in predictions:
+                logger.warning(f"No validation candle found for prediction {pred['id']}")
+            return [(pred, None) for pred in predictions]
+        
+        pred_times = np.fromiter(
+            (pred['timestamp'] for pred in predictions), dtype=np.int64, count=len(predictions)
+        )
+        
+        # Candle closest to validation time (earlier candle wins ties)
+        validation_times = pred_times + (settings.VALIDATION_DELAY_MINUTES * 60 * 1000)
+        after = np.searchsorted(timestamps, validation_times, side='left')
+        before = np.maximum(after - 1, 0)
+        after_clipped = np.minimum(after, n - 1)
+        use_before = (after == n) | (
+            (after > 0)
+            & (validation_times - timestamps[before] <= timestamps[after_clipped] - validation_times)
+        )
+        validation_idx = np.where(use_before, before, after_clipped)
+        # First of any candles sharing that timestamp
+        validation_idx = np.searchsorted(timestamps, timestamps[validation_idx], side='left')
+        
+        # Earliest candle within 1 minute of prediction time
+        prediction_idx = np.searchsorted(timestamps, pred_times - 60000, side='right')
+        prediction_idx_clipped = np.minimum(prediction_idx, n - 1)
+        has_prediction_candle = (prediction_idx < n) & (
+            timestamps[prediction_idx_clipped] < pred_times + 60000
+        )
+        
+        # Determine actual outcome
+        price_change = closes[validation_idx] - closes[prediction_idx_clipped]
+        actual_outcomes = np.where(
+            np.abs(price_change) < 0.00001,  # Essentially no change
+            'NEUTRAL',
+            np.where(price_change > 0, 'UP', 'DOWN')
+        ).tolist()
+        
+        outcomes = []
+        for pred, found, actual_outcome in zip(predictions, has_prediction_candle.tolist(), actual_outcomes):
+            if not found:
+                logger.warning(f"No prediction candle found for prediction {pred['id']}")
+                actual_outcome = None
+            outcomes.append((pred, actual_outcome))
+        
+        return outcomes
+    
+    async def _record_validations(self, outcomes: List[Tuple[Dict, str]]):
+        """Store the outcomes of a validation pass in one transaction"""
+        if not outcomes:
+            return
+        
+        results = [
+            (prediction['id'], prediction['prediction'] == actual_outcome, actual_outcome)
+            for prediction, actual_outcome in outcomes
+        ]
+        
         try:
-            # Get candle at validation time (T + 5 minutes)
-            validation_time = prediction['timestamp'] + (settings.VALIDATION_DELAY_MINUTES * 60 * 1000)
-            
-            # Get candles around validation time
-            candles = await self.db.get_recent_candles(count=50)
-            
-            # Find candle closest to validation time
-            validation_candle = None
-            min_diff = float('inf')
-            
-            for candle in candles:
-                diff = abs(candle['timestamp'] - validation_time)
-                if diff < min_diff:
-                    min_diff = diff
-                    validation_candle = candle
-            
-            if not validation_candle:
-                logger.warning(f"No validation candle found for prediction {prediction['id']}")
-                return
-            
-            # Get the candle at prediction time
-            prediction_candle = None
-            for candle in candles:
-                if abs(candle['timestamp'] - prediction['timestamp']) < 60000:  # Within 1 minute
-                    prediction_candle = candle
-                    break
-            
-            if not prediction_candle:
-                logger.warning(f"No prediction candle found for prediction {prediction['id']}")
-                return
-            
-            # Determine actual outcome
-            price_change = validation_candle['close'] - prediction_candle['close']
-            
-            if abs(price_change) < 0.00001:  # Essentially no change
-                actual_outcome = 'NEUTRAL'
-            elif price_change > 0:
-                actual_outcome = 'UP'
-            else:
-                actual_outcome = 'DOWN'
-            
-            # Check if prediction was correct
-            was_correct = (prediction['prediction'] == actual_outcome)
-            
             # Update database
-            await self.db.validate_prediction(
-                prediction['id'],
-                was_correct,
-                actual_outcome
-            )
-            
-            self.validations_since_retrain += 1
-            
+            await self.db.validate_predictions(results)
+        except Exception as e:
+            logger.error(f"Failed to store {len(results)} validations: {e}")
+            return
+        
+        self.validations_since_retrain += len(results)
+        
+        for (prediction, actual_outcome), (_, was_correct, _) in zip(outcomes, results):
             logger.info(
                 f"Prediction {prediction['id']}: "
                 f"Predicted {prediction['prediction']}, "
                 f"Actual {actual_outcome}, "
                 f"{'✓ CORRECT' if was_correct else '✗ WRONG'}"
             )
-            
-        except Exception as e:
-            logger.error(f"Failed to validate prediction {prediction.get('id')}: {e}")
     
     async def should_retrain(self) -> bool:
         """Check if model should be retrained"""
@@ -118,6 +148,9 @@ class LearningSystem:
         try:
             logger.info("Starting model retraining...")
             
+            # Validations that land while training count toward the next retrain
+            validations_used = self.validations_since_retrain
+            
             # Get training data
             X, y = await self.db.get_training_data(limit=1000)
             
@@ -126,10 +159,10 @@ class LearningSystem:
                 return {'success': False, 'reason': 'insufficient_data'}
             
             # Train model
-            training_stats = self.model.train(X, y)
+            training_stats = await self.model.train_async(X, y)
             
             # Reset counter
-            self.validations_since_retrain = 0
+            self.validations_since_retrain -= validations_used
             
             logger.info(
                 f"Model retrained: "
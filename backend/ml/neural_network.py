@@ -5,15 +5,58 @@ Neural Network Model - PyTorch implementation for binary trading predictions
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 import numpy as np
 from typing import List, Tuple, Dict
+import asyncio
+import contextlib
+import copy
+import io
 import os
 import logging
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Output index -> label
+CLASS_LABELS = ('UP', 'DOWN', 'NEUTRAL')
+
+
+@contextlib.contextmanager
+def _quiet_ort_quantizer():
+    """
+    Silence onnxruntime's quantizer below ERROR for the duration
+    
+    It logs progress both through its own loggers and straight through the
+    root logger. A filter on the root logger only sees records logged on
+    root itself, so the app's named loggers pass through untouched.
+    """
+    quantizer_logger = logging.getLogger('onnxruntime.quantization')
+    previous_level = quantizer_logger.level
+    root_logger = logging.getLogger()
+    
+    def drop_noise(record):
+        return record.levelno >= logging.ERROR
+    
+    quantizer_logger.setLevel(logging.ERROR)
+    root_logger.addFilter(drop_noise)
+    try:
+        yield
+    finally:
+        root_logger.removeFilter(drop_noise)
+        quantizer_logger.setLevel(previous_level)
+
 
 class TradingNeuralNetwork(nn.Module):
     """Neural network for predicting UP/DOWN/NEUTRAL outcomes"""
@@ -44,9 +87,9 @@ class TradingNeuralNetwork(nn.Module):
             if dropout_rates[i+1] > 0:
                 layers.append(nn.Dropout(dropout_rates[i+1]))
         
-        # Output layer (3 classes: UP, DOWN, NEUTRAL)
+        # Output layer (3 classes: UP, DOWN, NEUTRAL); emits logits, since
+        # CrossEntropyLoss applies log-softmax itself
         layers.append(nn.Linear(hidden_layers[-1], 3))
-        layers.append(nn.Softmax(dim=1))
         
         self.model = nn.Sequential(*layers)
     
@@ -54,14 +97,89 @@ class TradingNeuralNetwork(nn.Module):
         return self.model(x)
 
 
+class ServingModel(nn.Module):
+    """
+    Inference wrapper around a TradingNeuralNetwork snapshot
+    
+    Runs the snapshot in `dtype` and returns fp32 softmax probabilities.
+    """
+    
+    def __init__(self, model: nn.Module, dtype: torch.dtype = torch.float32):
+        super(ServingModel, self).__init__()
+        self.dtype = dtype
+        self.model = model.to(dtype)
+    
+    def forward(self, x):
+        # Softmax in fp32 even when the weights are half precision
+        return torch.softmax(self.model(x.to(self.dtype)).float(), dim=1)
+
+
+class CUDAGraphModel:
+    """
+    Replays a captured CUDA graph per batch size, so a forward pass is a
+    single launch instead of one per layer
+    
+    Used when torch.compile is off or unavailable. Other batch sizes run
+    the wrapped model eagerly. The returned tensor is a static buffer that
+    the next replay overwrites. Construct it on the thread that will call
+    it (ModelManager._install_snapshot does).
+    """
+    
+    def __init__(self, model: nn.Module, batch_sizes: List[int], input_size: int, device: torch.device):
+        self.model = model
+        self.graphs = {}
+        
+        with torch.inference_mode():
+            # Warm up on a side stream, as graph capture requires
+            side_stream = torch.cuda.Stream()
+            side_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(side_stream):
+                for batch_size in batch_sizes:
+                    model(torch.zeros(batch_size, input_size, device=device))
+            torch.cuda.current_stream().wait_stream(side_stream)
+            
+            for batch_size in batch_sizes:
+                static_input = torch.zeros(batch_size, input_size, device=device)
+                graph = torch.cuda.CUDAGraph()
+                # Only this thread's CUDA calls may disturb the capture
+                with torch.cuda.graph(graph, capture_error_mode='thread_local'):
+                    static_output = model(static_input)
+                self.graphs[batch_size] = (graph, static_input, static_output)
+    
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        captured = self.graphs.get(len(x))
+        if captured is None:
+            return self.model(x)
+        
+        graph, static_input, static_output = captured
+        static_input.copy_(x, non_blocking=True)
+        graph.replay()
+        return static_output
+
+
 class ModelManager:
     """Manages model training, loading, and prediction"""
     
     def __init__(self):
+        # self.model is trained in place; predictions use a separate snapshot
         self.model = None
+        self.train_forward = None
+        self.inference_model = None
+        self.ort_session = None
         self.optimizer = None
-        self.criterion = nn.CrossEntropyLoss()
+        self.scaler = None
+        self.criterion = nn.CrossEntropyLoss(label_smoothing=0.0, reduction='mean')
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        # Mixed precision only pays off on GPU tensor cores
+        self.use_amp = self.device.type == 'cuda'
+        # torch.compile removes per-op dispatch, which dominates a model this small on GPU
+        self.use_compile = settings.COMPILE_MODEL and self.device.type == 'cuda'
+        # Reused host staging buffers for CUDA inputs and streamed training batches
+        self._pinned_input = None
+        self._pinned_train = None
+        # Data-parallel position; see initialize_ddp
+        self.rank = 0
+        self.world_size = 1
         self.model_path = os.path.join(settings.MODEL_PATH, 'model.pth')
         self.stats = {
             'total_predictions': 0,
@@ -69,6 +187,11 @@ class ModelManager:
             'accuracy': 0.0,
             'version': 1
         }
+        # One worker so retrains never overlap
+        self._train_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="train")
+        # The serving thread for PyTorch snapshots; one worker keeps the
+        # pinned input buffer and per-thread CUDA graphs to a single thread
+        self._serve_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serve")
         
         logger.info(f"Using device: {self.device}")
     
@@ -79,6 +202,8 @@ class ModelManager:
             self.model.parameters(),
             lr=settings.LEARNING_RATE
         )
+        self.scaler = torch.amp.GradScaler('cuda', enabled=self.use_amp)
+        self.train_forward = self._compile(self.model)
         
         # Try to load existing model
         if os.path.exists(self.model_path):
@@ -89,6 +214,185 @@ class ModelManager:
                 logger.warning(f"Could not load model: {e}. Starting fresh.")
         else:
             logger.info("Initialized new model")
+        
+        # load_model already built it when a checkpoint was restored
+        if self.inference_model is None:
+            self._build_inference_model()
+    
+    def initialize_ddp(self, rank: int, world_size: int):
+        """
+        Train data-parallel across GPUs, one process per GPU (e.g. under torchrun)
+        
+        The network is small, so this pays off for offline sweeps over many
+        symbols or timeframes, not for the live server's 1000-row retrains.
+        Every rank must call train() with the same data; each trains on its
+        own shard and only rank 0 writes the checkpoint.
+        """
+        dist.init_process_group('nccl', rank=rank, world_size=world_size)
+        torch.cuda.set_device(rank)
+        
+        self.rank = rank
+        self.world_size = world_size
+        self.device = torch.device('cuda', rank)
+        self.initialize_model()
+        
+        # self.model stays unwrapped so checkpoints and serving snapshots are unchanged
+        self.train_forward = self._compile(DistributedDataParallel(
+            self.model,
+            device_ids=[rank],
+            bucket_cap_mb=25,
+            gradient_as_bucket_view=True
+        ))
+    
+    def _build_inference_model(self):
+        """Snapshot the trained weights and serve them, blocking until installed"""
+        self._serve_executor.submit(self._install_snapshot, *self._build_snapshot()).result()
+    
+    def _build_snapshot(self) -> Tuple[nn.Module, object]:
+        """
+        Snapshot the trained weights for serving, through ONNX Runtime when available
+        
+        On CPU the snapshot's Linear layers are dynamically quantized to int8
+        (QUANTIZE_INFERENCE_MODEL); self.model stays fp32 for retraining.
+        Nothing here touches CUDA graphs, so it may run on the training thread.
+        """
+        # Softmax is applied once here, for serving only
+        inference_model = ServingModel(copy.deepcopy(self.model), self._serving_dtype()).eval()
+        quantize = settings.QUANTIZE_INFERENCE_MODEL and self.device.type == 'cpu'
+        ort_session = None
+        
+        if ort is not None and settings.USE_ONNX_RUNTIME and self.device.type == 'cpu':
+            try:
+                ort_session = self._export_ort_session(inference_model, quantize)
+            except Exception as e:
+                logger.warning(f"ONNX Runtime export failed, serving with PyTorch: {e}")
+        
+        if ort_session is None and quantize:
+            inference_model = torch.ao.quantization.quantize_dynamic(
+                inference_model, {nn.Linear}, dtype=torch.qint8
+            )
+        
+        if self.device.type == 'cpu' and ort_session is None:
+            inference_model = self._freeze(inference_model)
+        
+        return inference_model, ort_session
+    
+    def _install_snapshot(self, inference_model: nn.Module, ort_session):
+        """
+        Start serving a snapshot from _build_snapshot
+        
+        Must run on the serving thread (_serve_executor): on CUDA the
+        snapshot is compiled or graph-captured here, and both are per-thread.
+        """
+        if self.device.type == 'cuda':
+            inference_model = self._prepare_cuda_model(inference_model)
+        
+        # Swap both together; predictions in flight keep the old snapshot
+        self.inference_model, self.ort_session = inference_model, ort_session
+    
+    def _serving_dtype(self) -> torch.dtype:
+        """bf16 weights on GPUs that support it, fp16 on older ones, fp32 on CPU"""
+        if not (settings.HALF_PRECISION_INFERENCE and self.device.type == 'cuda'):
+            return torch.float32
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    
+    def _compile(self, model: nn.Module, **kwargs) -> nn.Module:
+        """torch.compile with static shapes on CUDA; the module itself elsewhere"""
+        if not self.use_compile:
+            return model
+        return torch.compile(model, dynamic=False, **kwargs)
+    
+    def _prepare_cuda_model(self, model: nn.Module):
+        """
+        Compile the snapshot, or capture CUDA graphs if that is off or fails
+        
+        Runs on the serving thread (via _install_snapshot): reduce-overhead
+        records its cudagraph trees per thread, so a warm-up anywhere else
+        would be recorded again on the first real predictions.
+        """
+        if self.use_compile:
+            try:
+                compiled = self._compile(model, mode='reduce-overhead')
+                self._warm_up(compiled)
+                return compiled
+            except Exception as e:
+                logger.warning(f"torch.compile failed, capturing CUDA graphs instead: {e}")
+        
+        try:
+            return CUDAGraphModel(model, self._batch_buckets(), settings.MODEL_INPUT_FEATURES, self.device)
+        except Exception as e:
+            logger.warning(f"CUDA graph capture failed, serving eagerly: {e}")
+            return model
+    
+    @staticmethod
+    def _freeze(model: nn.Module):
+        """
+        Script and freeze the CPU snapshot into a flat graph
+        
+        Freezing inlines the weights and drops the module-tree dispatch,
+        which is most of a small-batch forward's cost here.
+        """
+        try:
+            with warnings.catch_warnings():
+                # TorchScript is deprecated in favour of torch.compile, which
+                # does not pay off for a CPU model this small
+                warnings.simplefilter('ignore', FutureWarning)
+                return torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.script(model)))
+        except Exception as e:
+            logger.warning(f"TorchScript freeze failed, serving eagerly: {e}")
+            return model
+    
+    def _warm_up(self, model: nn.Module):
+        """Compile and record every padded batch size before the snapshot starts serving"""
+        start = time.perf_counter()
+        with torch.inference_mode():
+            for batch_size in self._batch_buckets():
+                model(torch.zeros(batch_size, settings.MODEL_INPUT_FEATURES, device=self.device))
+        logger.info(f"Compiled serving model warmed up in {time.perf_counter() - start:.2f}s")
+    
+    @staticmethod
+    def _batch_buckets() -> List[int]:
+        """Power-of-two batch sizes up to PREDICT_BATCH_MAX_SIZE"""
+        buckets = [1]
+        while buckets[-1] < settings.PREDICT_BATCH_MAX_SIZE:
+            buckets.append(buckets[-1] * 2)
+        return buckets
+    
+    @staticmethod
+    def _export_ort_session(model: nn.Module, quantize: bool):
+        """Export the model to ONNX and open an optimized CPU session"""
+        buffer = io.BytesIO()
+        torch.onnx.export(
+            model,
+            torch.zeros(1, settings.MODEL_INPUT_FEATURES),
+            buffer,
+            input_names=['x'],
+            output_names=['probabilities'],
+            dynamic_axes={'x': {0: 'batch'}, 'probabilities': {0: 'batch'}},
+            opset_version=17,
+            dynamo=False
+        )
+        model_bytes = buffer.getvalue()
+        
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            
+            # The quantizer works on files
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                fp32_path = os.path.join(tmp_dir, 'model.onnx')
+                int8_path = os.path.join(tmp_dir, 'model.int8.onnx')
+                with open(fp32_path, 'wb') as f:
+                    f.write(model_bytes)
+                with _quiet_ort_quantizer():
+                    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+                with open(int8_path, 'rb') as f:
+                    model_bytes = f.read()
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = settings.ORT_INTRA_OP_THREADS
+        
+        return ort.InferenceSession(model_bytes, options, providers=['CPUExecutionProvider'])
     
     def predict(self, features: np.ndarray) -> Dict:
         """
@@ -100,43 +404,138 @@ class ModelManager:
         Returns:
             Dictionary with prediction, confidence, and probabilities
         """
-        if self.model is None:
-            raise ValueError("Model not initialized")
+        return self.predict_batch(features[np.newaxis])[0]
+    
+    async def predict_batch_async(self, features: np.ndarray) -> List[Dict]:
+        """
+        predict_batch without stalling the event loop
         
-        self.model.eval()
+        An ONNX Runtime session is fast enough to run inline; PyTorch
+        snapshots (CUDA, or CPU without ONNX Runtime) run on the serving
+        thread.
+        """
+        if self.ort_session is not None:
+            return self.predict_batch(features)
         
-        with torch.no_grad():
-            # Convert to tensor
-            x = torch.FloatTensor(features).unsqueeze(0).to(self.device)
-            
-            # Get prediction
-            output = self.model(x)
-            probabilities = output.cpu().numpy()[0]
-            
-            # Get class with highest probability
-            predicted_class = np.argmax(probabilities)
-            confidence = probabilities[predicted_class]
-            
-            # Map to prediction
-            class_map = {0: 'UP', 1: 'DOWN', 2: 'NEUTRAL'}
-            prediction = class_map[predicted_class]
-            
-            self.stats['total_predictions'] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._serve_executor, self.predict_batch, features)
+    
+    def predict_batch(self, features: np.ndarray) -> List[Dict]:
+        """
+        Make predictions for a batch in one forward pass
+        
+        Args:
+            features: numpy array of shape (N, features)
             
-            return {
-                'prediction': prediction,
-                'confidence': float(confidence),
-                'probabilities': {
-                    'UP': float(probabilities[0]),
-                    'DOWN': float(probabilities[1]),
-                    'NEUTRAL': float(probabilities[2])
-                }
+        Returns:
+            One prediction dictionary per row, as returned by predict
+        """
+        if self.inference_model is None:
+            raise ValueError("Model not initialized")
+        
+        x = np.ascontiguousarray(features, dtype=np.float32)
+        ort_session = self.ort_session
+        
+        if ort_session is not None:
+            probabilities = ort_session.run(None, {'x': x})[0]
+        else:
+            probabilities = self._torch_forward(x)
+        
+        predicted_classes = probabilities.argmax(axis=1).tolist()
+        self.stats['total_predictions'] += len(probabilities)
+        
+        # One bulk conversion to Python floats instead of a float() per element
+        return [
+            {
+                'prediction': CLASS_LABELS[predicted_class],
+                'confidence': probs[predicted_class],
+                'probabilities': dict(zip(CLASS_LABELS, probs)),
+                # Same values in CLASS_LABELS order, for vector math
+                'probability_vector': vector
             }
+            for probs, vector, predicted_class in zip(probabilities.tolist(), probabilities, predicted_classes)
+        ]
+    
+    def _torch_forward(self, x: np.ndarray) -> np.ndarray:
+        """
+        Run the PyTorch snapshot
+        
+        On CUDA, batches are padded to a power of two through a reused
+        pinned buffer, so the compiled or graph-captured snapshot only sees
+        the shapes prepared in _install_snapshot.
+        """
+        inference_model = self.inference_model
+        n = len(x)
+        
+        if self.device.type != 'cuda':
+            with torch.inference_mode():
+                return inference_model(torch.from_numpy(x).to(self.device)).cpu().numpy()
+        
+        padded = 1 << (n - 1).bit_length()
+        if self._pinned_input is None or len(self._pinned_input) < padded:
+            self._pinned_input = torch.zeros(
+                max(padded, settings.PREDICT_BATCH_MAX_SIZE),
+                x.shape[1]
+            ).pin_memory()
+        
+        host = self._pinned_input[:padded]
+        host[:n].copy_(torch.from_numpy(x))
+        host[n:].zero_()
+        
+        with torch.inference_mode():
+            output = inference_model(host.to(self.device, non_blocking=True))
+            return output[:n].cpu().numpy()
+    
+    def _to_device(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Move a host tensor to the device; on CUDA via pinned memory, without blocking"""
+        if self.device.type != 'cuda':
+            return tensor
+        return tensor.pin_memory().to(self.device, non_blocking=True)
+    
+    def _shuffle_into_pinned(self, X: torch.Tensor, y: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Shuffle host training data into pinned buffers reused across epochs and retrains"""
+        n = len(X)
+        
+        if self._pinned_train is None or len(self._pinned_train[0]) < n:
+            self._pinned_train = (
+                torch.empty(X.shape, dtype=X.dtype).pin_memory(),
+                torch.empty(y.shape, dtype=y.dtype).pin_memory()
+            )
+        else:
+            # Batch copies queued from the previous epoch may still be reading them
+            torch.cuda.current_stream(self.device).synchronize()
+        
+        X_epoch, y_epoch = self._pinned_train[0][:n], self._pinned_train[1][:n]
+        permutation = torch.randperm(n)
+        torch.index_select(X, 0, permutation, out=X_epoch)
+        torch.index_select(y, 0, permutation, out=y_epoch)
+        
+        return X_epoch, y_epoch
+    
+    def _autocast(self):
+        """Mixed-precision context for training; a no-op on CPU"""
+        return torch.autocast(device_type=self.device.type, dtype=torch.float16, enabled=self.use_amp)
+    
+    async def train_async(self, X: np.ndarray, y: np.ndarray) -> Dict:
+        """
+        Run train() on the training thread so the event loop keeps serving,
+        then swap in the new weights on the serving thread
+        """
+        loop = asyncio.get_running_loop()
+        stats, snapshot = await loop.run_in_executor(self._train_executor, self._train_and_snapshot, X, y)
+        await loop.run_in_executor(self._serve_executor, self._install_snapshot, *snapshot)
+        return stats
+    
+    def _train_and_snapshot(self, X: np.ndarray, y: np.ndarray) -> Tuple[Dict, Tuple[nn.Module, object]]:
+        """Train, then build the serving snapshot before the training thread lets go"""
+        return self.train(X, y), self._build_snapshot()
     
     def train(self, X: np.ndarray, y: np.ndarray) -> Dict:
         """
         Train model on data
         
+        Serving is not updated here; train_async installs the new weights.
+        
         Args:
             X: Features array (N, features)
             y: Labels array (N,) with values 0=UP, 1=DOWN, 2=NEUTRAL
@@ -149,57 +548,89 @@ class ModelManager:
         
         logger.info(f"Training on {len(X)} samples")
         
-        # Convert to tensors
-        X_tensor = torch.FloatTensor(X).to(self.device)
-        y_tensor = torch.LongTensor(y).to(self.device)
+        # Convert to tensors, copying only inputs that aren't already
+        # contiguous, writable and of the right dtype
+        X_tensor = torch.from_numpy(np.require(X, dtype=np.float32, requirements=['C', 'W']))
+        y_tensor = torch.from_numpy(np.require(y, dtype=np.int64, requirements=['C', 'W']))
         
         # Split into train/validation
         val_split = int(len(X) * settings.VALIDATION_SPLIT)
         X_train, X_val = X_tensor[:-val_split], X_tensor[-val_split:]
         y_train, y_val = y_tensor[:-val_split], y_tensor[-val_split:]
+        X_val, y_val = self._to_device(X_val), self._to_device(y_val)
+        
+        # Small training sets stay on the device for every epoch; larger
+        # ones stay on the host and are streamed one batch at a time
+        stream_batches = self.device.type == 'cuda' and X_train.nbytes > settings.TRAIN_DEVICE_RESIDENT_BYTES
+        if not stream_batches:
+            X_train, y_train = self._to_device(X_train), self._to_device(y_train)
         
-        # Training loop
+        if self.world_size > 1:
+            # Equal shards, so every rank runs the same number of steps
+            shard = len(X_train) // self.world_size
+            X_train = X_train[self.rank * shard:(self.rank + 1) * shard]
+            y_train = y_train[self.rank * shard:(self.rank + 1) * shard]
+            dist.barrier()
+        
+        # Training loop; per-epoch metrics stay on device until the end,
+        # since reading each one back would sync the GPU
         self.model.train()
-        train_losses = []
-        val_accuracies = []
+        # Row 0: mean training loss, row 1: validation accuracy
+        epoch_metrics = torch.empty((2, settings.TRAINING_EPOCHS), device=self.device)
         
         for epoch in range(settings.TRAINING_EPOCHS):
             # Mini-batch training
             batch_size = settings.BATCH_SIZE
             num_batches = len(X_train) // batch_size
             
-            epoch_loss = 0
+            # Reshuffle each epoch; one gather, then batches are views
+            if stream_batches:
+                X_epoch, y_epoch = self._shuffle_into_pinned(X_train, y_train)
+            else:
+                permutation = torch.randperm(len(X_train), device=self.device)
+                X_epoch, y_epoch = X_train[permutation], y_train[permutation]
+            
+            epoch_loss = torch.zeros((), device=self.device)
             for i in range(num_batches):
                 start_idx = i * batch_size
                 end_idx = start_idx + batch_size
                 
-                batch_X = X_train[start_idx:end_idx]
-                batch_y = y_train[start_idx:end_idx]
+                # A no-op for device-resident data; otherwise the copy overlaps
+                # the previous batch's backward pass
+                batch_X = X_epoch[start_idx:end_idx].to(self.device, non_blocking=True)
+                batch_y = y_epoch[start_idx:end_idx].to(self.device, non_blocking=True)
                 
-                # Forward pass
+                # Forward pass (fp16 on GPU)
                 self.optimizer.zero_grad()
-                outputs = self.model(batch_X)
-                loss = self.criterion(outputs, batch_y)
+                with self._autocast():
+                    outputs = self.train_forward(batch_X)
+                    loss = self.criterion(outputs, batch_y)
                 
-                # Backward pass
-                loss.backward()
-                self.optimizer.step()
+                # Backward pass; the scaler keeps fp16 gradients from underflowing
+                self.scaler.scale(loss).backward()
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
                 
-                epoch_loss += loss.item()
+                epoch_loss += loss.detach()
             
-            avg_loss = epoch_loss / num_batches
-            train_losses.append(avg_loss)
+            epoch_metrics[0, epoch] = epoch_loss / num_batches
             
             # Validation
             self.model.eval()
-            with torch.no_grad():
+            with torch.no_grad(), self._autocast():
                 val_outputs = self.model(X_val)
                 val_predictions = torch.argmax(val_outputs, dim=1)
-                val_accuracy = (val_predictions == y_val).float().mean().item()
-                val_accuracies.append(val_accuracy)
+                epoch_metrics[1, epoch] = (val_predictions == y_val).float().mean()
             
             self.model.train()
-            
+        
+        if self.world_size > 1:
+            dist.barrier()
+        
+        # One device-to-host read for the whole run
+        train_losses, val_accuracies = epoch_metrics.tolist()
+        
+        for epoch, (avg_loss, val_accuracy) in enumerate(zip(train_losses, val_accuracies)):
             logger.info(f"Epoch {epoch+1}/{settings.TRAINING_EPOCHS} - Loss: {avg_loss:.4f}, Val Acc: {val_accuracy:.4f}")
         
         # Final validation accuracy
@@ -212,7 +643,8 @@ class ModelManager:
         # Save model if improved
         if final_accuracy > 0.5:  # Better than random
             self.save_model()
-            logger.info(f"Model saved with accuracy: {final_accuracy:.4f}")
+            if self.rank == 0:
+                logger.info(f"Model saved with accuracy: {final_accuracy:.4f}")
         
         return {
             'epochs': settings.TRAINING_EPOCHS,
@@ -224,11 +656,15 @@ class ModelManager:
     
     def save_model(self):
         """Save model to disk"""
+        if self.rank != 0:
+            return
+        
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         
         torch.save({
             'model_state_dict': self.model.state_dict(),
             'optimizer_state_dict': self.optimizer.state_dict(),
+            'scaler_state_dict': self.scaler.state_dict(),
             'stats': self.stats
         }, self.model_path)
         
@@ -244,10 +680,16 @@ class ModelManager:
                 self.model.parameters(),
                 lr=settings.LEARNING_RATE
             )
+            self.scaler = torch.amp.GradScaler('cuda', enabled=self.use_amp)
+            self.train_forward = self._compile(self.model)
         
         self.model.load_state_dict(checkpoint['model_state_dict'])
         self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        # Older checkpoints (and CPU runs) carry no scaler state
+        if checkpoint.get('scaler_state_dict') and self.scaler.is_enabled():
+            self.scaler.load_state_dict(checkpoint['scaler_state_dict'])
         self.stats = checkpoint.get('stats', self.stats)
+        self._build_inference_model()
         
         logger.info(f"Model loaded from {self.model_path}")
     
@@ -4,10 +4,31 @@ Pattern Detector - Identifies classic technical analysis patterns
 
 from typing import List, Dict
 
+import numpy as np
+
+from ml.feature_kernel import NUMBA_AVAILABLE, detect_patterns as detect_patterns_compiled
+
 
 class PatternDetector:
     """Detect classic candlestick patterns"""
     
+    # Detection order; bit i of the compiled kernel's mask is PATTERNS[i]
+    PATTERNS = (
+        'hammer',
+        'inverted_hammer',
+        'doji',
+        'dragonfly_doji',
+        'gravestone_doji',
+        'bullish_engulfing',
+        'bearish_engulfing',
+        'bullish_harami',
+        'bearish_harami',
+        'morning_star',
+        'evening_star',
+        'three_white_soldiers',
+        'three_black_crows'
+    )
+    
     @staticmethod
     def detect_patterns(candles: List[Dict]) -> List[str]:
         """
@@ -16,56 +37,151 @@ class PatternDetector:
         Returns:
             List of detected pattern names
         """
-        patterns = []
-        
         if len(candles) < 3:
-            return patterns
+            return []
         
-        # Single candle patterns
-        last_candle = candles[-1]
+        if not NUMBA_AVAILABLE:
+            return PatternDetector._detect_patterns_python(candles)
         
-        if PatternDetector.is_hammer(last_candle):
-            patterns.append('hammer')
+        ohlc = np.array(
+            [(c['open'], c['high'], c['low'], c['close']) for c in candles[-3:]],
+            dtype=np.float64
+        )
+        mask = detect_patterns_compiled(np.ascontiguousarray(ohlc.T))
         
-        if PatternDetector.is_inverted_hammer(last_candle):
-            patterns.append('inverted_hammer')
+        return [name for bit, name in enumerate(PatternDetector.PATTERNS) if mask >> bit & 1]
+    
+    @staticmethod
+    def detect_patterns_batch(ohlc: np.ndarray) -> np.ndarray:
+        """
+        Detect patterns for every window of a candle history at once
         
-        if PatternDetector.is_doji(last_candle):
-            patterns.append('doji')
+        Args:
+            ohlc: (4, N) open/high/low/close array, oldest candle first
+            
+        Returns:
+            (N, len(PATTERNS)) bool array; row i holds what detect_patterns
+            reports for candles[:i + 1], so rows 0 and 1 are always False
+        """
+        n = ohlc.shape[1]
+        detected = np.zeros((n, len(PatternDetector.PATTERNS)), dtype=bool)
+        if n < 3:
+            return detected
         
-        if PatternDetector.is_dragonfly_doji(last_candle):
-            patterns.append('dragonfly_doji')
+        o, h, l, c = ohlc
+        body = np.abs(c - o)
+        total_range = h - l
+        lower_shadow = np.minimum(o, c) - l
+        upper_shadow = h - np.maximum(o, c)
+        bullish = c > o
+        bearish = c < o
+        
+        has_range = total_range != 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            doji = has_range & (body / total_range < 0.1)
+        small_body = has_range & (body < total_range * 0.3)
+        
+        # Oldest, middle and newest candle of each three-candle window
+        first, second, last = slice(0, n - 2), slice(1, n - 1), slice(2, n)
+        
+        second_small = body[second] < body[first] * 0.5
+        engulfs = (o[last] < c[second]) & (c[last] > o[second])
+        inside = (o[last] > c[second]) & (c[last] < o[second])
+        bullish_turn = bearish[second] & bullish[last]
+        bearish_turn = bullish[second] & bearish[last]
+        
+        columns = (
+            small_body & (lower_shadow > body * 2) & (upper_shadow < body * 0.3),
+            small_body & (upper_shadow > body * 2) & (lower_shadow < body * 0.3),
+            doji,
+            doji & (lower_shadow > total_range * 0.6) & (upper_shadow < total_range * 0.1),
+            doji & (upper_shadow > total_range * 0.6) & (lower_shadow < total_range * 0.1),
+            bullish_turn & engulfs,
+            bearish_turn & inside,
+            bullish_turn & inside,
+            bearish_turn & engulfs,
+            bearish[first] & second_small & bullish[last],
+            bullish[first] & second_small & bearish[last],
+            bullish[first] & bullish[second] & bullish[last] & (c[second] > c[first]) & (c[last] > c[second]),
+            bearish[first] & bearish[second] & bearish[last] & (c[second] < c[first]) & (c[last] < c[second])
+        )
         
-        if PatternDetector.is_gravestone_doji(last_candle):
-            patterns.append('gravestone_doji')
+        for index, column in enumerate(columns):
+            # Single-candle columns cover every row; the rest start at the third
+            detected[2:, index] = column[-(n - 2):]
         
-        # Two candle patterns
-        if len(candles) >= 2:
-            if PatternDetector.is_bullish_engulfing(candles[-2:]):
-                patterns.append('bullish_engulfing')
+        return detected
+    
+    @staticmethod
+    def _detect_patterns_python(candles: List[Dict]) -> List[str]:
+        """
+        Evaluate the predicates in Python (used when Numba is missing)
+        
+        Same logic as the is_* helpers, with the shared body, shadow and
+        direction terms computed once.
+        """
+        patterns = []
+        
+        first, prev, last = candles[-3], candles[-2], candles[-1]
+        o0, c0 = first['open'], first['close']
+        o1, c1 = prev['open'], prev['close']
+        o, h, l, c = last['open'], last['high'], last['low'], last['close']
+        
+        # Single candle patterns
+        total_range = h - l
+        if total_range != 0:
+            body = abs(c - o)
+            lower_shadow = min(o, c) - l
+            upper_shadow = h - max(o, c)
+            small_body = body < total_range * 0.3
             
-            if PatternDetector.is_bearish_engulfing(candles[-2:]):
-                patterns.append('bearish_engulfing')
+            if lower_shadow > body * 2 and upper_shadow < body * 0.3 and small_body:
+                patterns.append('hammer')
             
-            if PatternDetector.is_bullish_harami(candles[-2:]):
-                patterns.append('bullish_harami')
+            if upper_shadow > body * 2 and lower_shadow < body * 0.3 and small_body:
+                patterns.append('inverted_hammer')
             
-            if PatternDetector.is_bearish_harami(candles[-2:]):
-                patterns.append('bearish_harami')
+            if body / total_range < 0.1:
+                patterns.append('doji')
+                
+                if lower_shadow > total_range * 0.6 and upper_shadow < total_range * 0.1:
+                    patterns.append('dragonfly_doji')
+                
+                if upper_shadow > total_range * 0.6 and lower_shadow < total_range * 0.1:
+                    patterns.append('gravestone_doji')
+        
+        # Two candle patterns
+        prev_bullish, prev_bearish = c1 > o1, c1 < o1
+        curr_bullish, curr_bearish = c > o, c < o
+        engulfs = o < c1 and c > o1
+        inside = o > c1 and c < o1
+        
+        if prev_bearish and curr_bullish and engulfs:
+            patterns.append('bullish_engulfing')
+        
+        if prev_bullish and curr_bearish and inside:
+            patterns.append('bearish_engulfing')
+        
+        if prev_bearish and curr_bullish and inside:
+            patterns.append('bullish_harami')
+        
+        if prev_bullish and curr_bearish and engulfs:
+            patterns.append('bearish_harami')
         
         # Three candle patterns
-        if len(candles) >= 3:
-            if PatternDetector.is_morning_star(candles[-3:]):
-                patterns.append('morning_star')
-            
-            if PatternDetector.is_evening_star(candles[-3:]):
-                patterns.append('evening_star')
-            
-            if PatternDetector.is_three_white_soldiers(candles[-3:]):
-                patterns.append('three_white_soldiers')
-            
-            if PatternDetector.is_three_black_crows(candles[-3:]):
-                patterns.append('three_black_crows')
+        second_small = abs(c1 - o1) < abs(c0 - o0) * 0.5
+        
+        if c0 < o0 and second_small and curr_bullish:
+            patterns.append('morning_star')
+        
+        if c0 > o0 and second_small and curr_bearish:
+            patterns.append('evening_star')
+        
+        if c0 > o0 and prev_bullish and curr_bullish and c1 > c0 and c > c1:
+            patterns.append('three_white_soldiers')
+        
+        if c0 < o0 and prev_bearish and curr_bearish and c1 < c0 and c < c1:
+            patterns.append('three_black_crows')
         
         return patterns
     
@@ -264,10 +380,15 @@ class PatternDetector:
         if len(candles) < 3:
             return False
         
-        return all(
-            c['close'] > c['open'] and
-            (i == 0 or c['close'] > candles[i-1]['close'])
-            for i, c in enumerate(candles)
+        first, second, third = candles[0], candles[1], candles[2]
+        first_close, second_close, third_close = first['close'], second['close'], third['close']
+        
+        return (
+            first_close > first['open'] and
+            second_close > second['open'] and
+            third_close > third['open'] and
+            second_close > first_close and
+            third_close > second_close
         )
     
     @staticmethod
@@ -276,8 +397,13 @@ class PatternDetector:
         if len(candles) < 3:
             return False
         
-        return all(
-            c['close'] < c['open'] and
-            (i == 0 or c['close'] < candles[i-1]['close'])
-            for i, c in enumerate(candles)
+        first, second, third = candles[0], candles[1], candles[2]
+        first_close, second_close, third_close = first['close'], second['close'], third['close']
+        
+        return (
+            first_close < first['open'] and
+            second_close < second['open'] and
+            third_close < third['open'] and
+            second_close < first_close and
+            third_close < second_close
         )
@@ -3,18 +3,82 @@ Prediction Engine - Combines ML model and historical patterns for predictions
 """
 
 import numpy as np
+import asyncio
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime
 
 from ml.feature_extractor import FeatureExtractor
 from ml.pattern_detector import PatternDetector
-from ml.neural_network import ModelManager
+from ml.neural_network import CLASS_LABELS, ModelManager
 from ai.gemini_client import GeminiClient
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Historical prediction -> class probabilities, as slope * confidence + base
+# (in CLASS_LABELS order): the predicted class gets the confidence and the
+# other two split the remainder; NEUTRAL maps to a flat prior
+_LABEL_INDEX = {label: i for i, label in enumerate(CLASS_LABELS)}
+_HIST_PROB_SLOPE = np.array([
+    [1.0, -0.5, -0.5],
+    [-0.5, 1.0, -0.5],
+    [0.0, 0.0, 0.0]
+])
+_HIST_PROB_BASE = np.array([
+    [0.0, 0.5, 0.5],
+    [0.5, 0.0, 0.5],
+    [0.33, 0.33, 0.34]
+])
+
+
+class PredictBatcher:
+    """Coalesces ML inference requests that arrive close together into one forward pass"""
+    
+    def __init__(self, model_manager: ModelManager):
+        self.model_manager = model_manager
+        self._queue = asyncio.Queue()
+        self._worker = None
+    
+    async def submit(self, feature_array: np.ndarray) -> Dict:
+        """Queue one feature vector and wait for its prediction"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((feature_array, future))
+        return await future
+    
+    async def _run(self):
+        """Wait for a request, let the window fill, then predict everything queued"""
+        window = settings.PREDICT_BATCH_WINDOW_MS / 1000
+        max_size = settings.PREDICT_BATCH_MAX_SIZE
+        
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(window)
+            while len(batch) < max_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            futures = [future for _, future in batch]
+            try:
+                results = await self.model_manager.predict_batch_async(
+                    np.stack([features for features, _ in batch])
+                )
+                for future, result in zip(futures, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    async def stop(self):
+        """Cancel the worker"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
 
 class PredictionEngine:
     """Main prediction engine combining ML and pattern matching"""
@@ -25,6 +89,7 @@ class PredictionEngine:
         self.gemini = gemini_client
         self.feature_extractor = FeatureExtractor()
         self.pattern_detector = PatternDetector()
+        self.predict_batcher = PredictBatcher(model_manager)
         
     async def predict(self, candles: List[Dict]) -> Optional[Dict]:
         """
@@ -41,18 +106,18 @@ class PredictionEngine:
             return None
         
         try:
-            # Extract features
-            features = self.feature_extractor.extract_features(candles)
+            # Extract features (cached per candle window)
+            features, feature_array = self.feature_extractor.extract(candles)
             
             # Detect patterns
             patterns = self.pattern_detector.detect_patterns(candles)
             
-            # Get ML prediction
-            feature_array = self.feature_extractor.features_to_array(features)
-            ml_prediction = self.model_manager.predict(feature_array)
-            
-            # Get historical pattern matching
-            historical_prediction = await self._get_historical_prediction(features, patterns)
+            # ML prediction and historical pattern matching are independent:
+            # inference runs while the lookup waits on the database thread
+            ml_prediction, historical_prediction = await asyncio.gather(
+                self.predict_batcher.submit(feature_array),
+                self._get_historical_prediction(features, patterns)
+            )
             
             # Combine predictions (ensemble)
             ensemble_prediction = self._combine_predictions(ml_prediction, historical_prediction)
@@ -91,7 +156,8 @@ class PredictionEngine:
             # Add metadata
             ensemble_prediction.update({
                 'timestamp': datetime.now().isoformat(),
-                'features': features,
+                'features': features.to_dict(),
+                'feature_array': feature_array,
                 'patterns': patterns,
                 'candles_analyzed': len(candles),
                 'meets_threshold': ensemble_prediction['confidence'] >= settings.MIN_CONFIDENCE_THRESHOLD
@@ -109,6 +175,10 @@ class PredictionEngine:
             logger.error(f"Prediction failed: {e}", exc_info=True)
             return None
     
+    async def shutdown(self):
+        """Stop the inference batcher"""
+        await self.predict_batcher.stop()
+    
     async def _get_historical_prediction(self, features: Dict, patterns: List[str]) -> Dict:
         """
         Get prediction based on historical similar patterns
@@ -171,35 +241,17 @@ class PredictionEngine:
         ml_weight = settings.ENSEMBLE_WEIGHTS['ml']
         hist_weight = settings.ENSEMBLE_WEIGHTS['historical']
         
-        # Get probabilities
-        ml_probs = ml_pred['probabilities']
-        
         # Convert historical to probabilities
-        hist_probs = {
-            'UP': 0.33,
-            'DOWN': 0.33,
-            'NEUTRAL': 0.34
-        }
+        hist_index = _LABEL_INDEX[hist_pred['prediction']]
+        hist_probs = _HIST_PROB_SLOPE[hist_index] * hist_pred['confidence'] + _HIST_PROB_BASE[hist_index]
         
-        if hist_pred['prediction'] == 'UP':
-            hist_probs['UP'] = hist_pred['confidence']
-            hist_probs['DOWN'] = (1 - hist_pred['confidence']) / 2
-            hist_probs['NEUTRAL'] = (1 - hist_pred['confidence']) / 2
-        elif hist_pred['prediction'] == 'DOWN':
-            hist_probs['DOWN'] = hist_pred['confidence']
-            hist_probs['UP'] = (1 - hist_pred['confidence']) / 2
-            hist_probs['NEUTRAL'] = (1 - hist_pred['confidence']) / 2
-        
-        # Combine probabilities
-        combined_probs = {
-            'UP': ml_probs['UP'] * ml_weight + hist_probs['UP'] * hist_weight,
-            'DOWN': ml_probs['DOWN'] * ml_weight + hist_probs['DOWN'] * hist_weight,
-            'NEUTRAL': ml_probs['NEUTRAL'] * ml_weight + hist_probs['NEUTRAL'] * hist_weight
-        }
+        # Combine probabilities (first class wins ties, as before)
+        combined = ml_pred['probability_vector'] * ml_weight + hist_probs * hist_weight
+        predicted_class = int(combined.argmax())
         
-        # Get final prediction
-        final_prediction = max(combined_probs, key=combined_probs.get)
-        final_confidence = combined_probs[final_prediction]
+        final_prediction = CLASS_LABELS[predicted_class]
+        final_confidence = float(combined[predicted_class])
+        combined_probs = dict(zip(CLASS_LABELS, combined.tolist()))
         
         return {
             'prediction': final_prediction,